@@ -0,0 +1,369 @@
+import argparse
+import io
+import json
+import math
+import random
+import struct
+import unicodedata
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+# Synthetic submissions shaped like the real ones: nested directories or one zip per submission holding
+# docx, doc and pdf files with Slovak names. Everything derives from the seed, the same spec always
+# generates the same bytes.
+
+FIRST_NAMES = ['Ján', 'Mária', 'Peter', 'Zuzana', 'Ľubomír', 'Katarína', 'Tomáš', 'Ivana', 'Dušan', 'Jozef']
+LAST_NAMES = ['Novák', 'Kováčová', 'Horváth', 'Šimková', 'Baláž', 'Tóthová', 'Černý', 'Ďurica', 'Žilinský']
+TITLE_WORDS = [
+    'záverečná', 'práca', 'úloha', 'príloha', 'analýza', 'riešenie', 'návrh', 'dokumentácia',
+    'čiastková', 'správa', 'výsledky', 'zadanie', 'ľahká', 'ťažká', 'kód', 'poznámky'
+]
+TEMPLATES = ['Normal.dotm', 'Normal.dot', 'Šablóna FIIT.dotx', 'Diplomová práca.dotx']
+CREATORS = ['Microsoft® Word 2016', 'Microsoft® Word for Microsoft 365', 'LibreOffice 7.3', 'pdfTeX-1.40.21']
+# Name encodings of zipped submissions, the legacy ones are stored without the UTF-8 flag
+NAME_ENCODINGS = ['cp852', 'cp437', 'utf-8']
+
+SECTOR_SIZE = 512
+MINI_SECTOR_SIZE = 64
+MINI_STREAM_CUTOFF = 4096
+ENDOFCHAIN = 0xFFFFFFFE
+FREESECT = 0xFFFFFFFF
+FATSECT = 0xFFFFFFFD
+NOSTREAM = 0xFFFFFFFF
+
+
+class CorpusSpec(NamedTuple):
+    submissions: int = 50
+    docx: int = 3  # Files of each type per submission
+    doc: int = 1
+    pdf: int = 2
+    file_size: int = 20_000  # Approximate bytes of content per file
+    corrupt: float = 0.05  # Share of files that are broken on purpose
+    nesting: int = 2  # Deepest subdirectory of a file within its submission
+    seed: int = 0
+
+
+# Archive entry with a fixed timestamp, so archives come out the same on every run. A legacy `encoding`
+# stores the name in that code page without the UTF-8 flag, like old Windows archivers do. zipfile has
+# no public way to do this, its name encoding hook is overridden instead.
+class CorpusZipInfo(zipfile.ZipInfo):
+
+    def __init__(self, filename: str, encoding: str | None = None):
+        super().__init__(filename, date_time=(2021, 12, 14, 12, 0, 0))
+        self.encoding = encoding
+        self.compress_type = zipfile.ZIP_DEFLATED
+
+    def _encodeFilenameFlags(self):
+        if self.encoding is None:
+            return super()._encodeFilenameFlags()
+        return self.filename.encode(self.encoding), self.flag_bits
+
+
+def filler_text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(TITLE_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def random_datetime(rng: random.Random) -> datetime:
+    return datetime(2021, 9, 1) + timedelta(seconds=rng.randrange(120 * 24 * 3600))
+
+
+def person(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def make_docx(rng: random.Random, size: int) -> bytes:
+    created = random_datetime(rng)
+    modified = created + timedelta(minutes=rng.randrange(1, 5000))
+    date_format = '%Y-%m-%dT%H:%M:%SZ'
+    core = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'<dc:creator>{person(rng)}</dc:creator><cp:lastModifiedBy>{person(rng)}</cp:lastModifiedBy>'
+        f'<dcterms:created xsi:type="dcterms:W3CDTF">{created.strftime(date_format)}</dcterms:created>'
+        f'<dcterms:modified xsi:type="dcterms:W3CDTF">{modified.strftime(date_format)}</dcterms:modified>'
+        '</cp:coreProperties>'
+    )
+    app = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+        f'<Template>{rng.choice(TEMPLATES)}</Template><TotalTime>{rng.randrange(0, 3000)}</TotalTime>'
+        f'<Pages>{rng.randrange(1, 80)}</Pages></Properties>'
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        f'<w:p><w:r><w:t>{filler_text(rng, size)}</w:t></w:r></w:p></w:body></w:document>'
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="xml" ContentType="application/xml"/></Types>'
+    )
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(CorpusZipInfo('[Content_Types].xml'), content_types)
+        zf.writestr(CorpusZipInfo('docProps/core.xml'), core)
+        zf.writestr(CorpusZipInfo('docProps/app.xml'), app)
+        zf.writestr(CorpusZipInfo('word/document.xml'), document)
+    return buffer.getvalue()
+
+
+def filetime(value: datetime) -> int:
+    return (value - datetime(1601, 1, 1)) // timedelta(microseconds=1) * 10
+
+
+def property_set(properties: List[Tuple[int, int, object]]) -> bytes:
+    values = b''
+    entries = b''
+    base = 8 + 8 * len(properties)
+    for property_id, property_type, value in properties:
+        entries += struct.pack('<II', property_id, base + len(values))
+        if property_type == 2:  # VT_I2
+            values += struct.pack('<IH2x', property_type, value)
+        elif property_type == 3:  # VT_I4
+            values += struct.pack('<Ii', property_type, value)
+        elif property_type == 30:  # VT_LPSTR
+            raw = value + b'\x00'
+            values += struct.pack('<II', property_type, len(raw)) + raw + b'\x00' * (-len(raw) % 4)
+        elif property_type == 64:  # VT_FILETIME
+            values += struct.pack('<IQ', property_type, value)
+
+    section = struct.pack('<II', base + len(values), len(properties)) + entries + values
+    summary_format = bytes.fromhex('e0859ff2f94f6810ab9108002b27b3d9')
+    header = struct.pack('<HHI16sI', 0xFFFE, 0, 0x00020006, b'\x00' * 16, 1)
+    return header + summary_format + struct.pack('<I', 48) + section
+
+
+# Version 3 compound file with the given streams below the root, small ones in the mini stream.
+# Files stay below the 109 FAT sectors of the header, about 6 MB, so no DIFAT is needed.
+def compound_file(streams: List[Tuple[str, bytes]]) -> bytes:
+    mini_stream = b''
+    minifat: List[int] = []
+    starts: List[int] = []
+    big: List[int] = []
+    for index, (_, data) in enumerate(streams):
+        if len(data) < MINI_STREAM_CUTOFF:
+            start = len(mini_stream) // MINI_SECTOR_SIZE
+            count = math.ceil(len(data) / MINI_SECTOR_SIZE)
+            minifat.extend(start + i + 1 if i < count - 1 else ENDOFCHAIN for i in range(count))
+            mini_stream += data.ljust(count * MINI_SECTOR_SIZE, b'\x00')
+            starts.append(start if count else ENDOFCHAIN)
+        else:
+            big.append(index)
+            starts.append(-1)
+
+    # Sector runs after the FAT: directory, mini FAT, mini stream, large streams
+    entry_count = len(streams) + 1
+    runs: List[Tuple[str | int, bytes]] = [('directory', b'')]
+    runs.append(('minifat', struct.pack(f'<{len(minifat)}I', *minifat)))
+    runs.append(('mini_stream', mini_stream))
+    runs.extend((index, streams[index][1]) for index in big)
+    lengths = {
+        key: math.ceil((entry_count * 128 if key == 'directory' else len(data)) / SECTOR_SIZE) for key, data in runs
+    }
+    data_sectors = sum(lengths.values())
+    fat_sectors = 1
+    while fat_sectors * (SECTOR_SIZE // 4) < fat_sectors + data_sectors:
+        fat_sectors += 1
+    if fat_sectors > 109:
+        raise ValueError("Compound file too large without a DIFAT")
+
+    fat = [FATSECT] * fat_sectors
+    run_starts = {}
+    for key, _ in runs:
+        count = lengths[key]
+        run_starts[key] = len(fat) if count else ENDOFCHAIN
+        fat.extend(len(fat) + i + 1 if i < count - 1 else ENDOFCHAIN for i in range(count))
+    fat.extend([FREESECT] * (fat_sectors * (SECTOR_SIZE // 4) - len(fat)))
+    for index in big:
+        starts[index] = run_starts[index]
+
+    def directory_entry(name: str, entry_type: int, right: int, child: int, start: int, size: int) -> bytes:
+        encoded = name.encode('utf-16-le') + b'\x00\x00'
+        return (
+            encoded.ljust(64, b'\x00') + struct.pack('<HBBIII', len(encoded), entry_type, 1, NOSTREAM, right, child)
+            + b'\x00' * 36 + struct.pack('<IQ', start, size)
+        )
+
+    # Streams hang off the root as a chain of right siblings
+    directory = directory_entry(
+        'Root Entry', 5, NOSTREAM, 1 if streams else NOSTREAM, run_starts['mini_stream'], len(mini_stream)
+    )
+    for index, (name, data) in enumerate(streams):
+        right = index + 2 if index + 1 < len(streams) else NOSTREAM
+        directory += directory_entry(name, 2, right, NOSTREAM, starts[index], len(data))
+
+    contents = {key: data for key, data in runs}
+    contents['directory'] = directory
+    body = struct.pack(f'<{len(fat)}I', *fat)
+    for key, _ in runs:
+        body += contents[key].ljust(lengths[key] * SECTOR_SIZE, b'\x00')
+
+    header = (
+        b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + b'\x00' * 16
+        + struct.pack('<HHHHH', 0x3E, 3, 0xFFFE, 9, 6) + b'\x00' * 6
+        + struct.pack(
+            '<IIIIIIIII', 0, fat_sectors, run_starts['directory'], 0, MINI_STREAM_CUTOFF,
+            run_starts['minifat'], lengths['minifat'], ENDOFCHAIN, 0
+        )
+        + struct.pack('<109I', *(list(range(fat_sectors)) + [FREESECT] * (109 - fat_sectors)))
+    )
+    return header + body
+
+
+def make_doc(rng: random.Random, size: int) -> bytes:
+    created = random_datetime(rng)
+    saved = created + timedelta(minutes=rng.randrange(1, 5000))
+    summary = property_set([
+        (1, 2, 65001),  # Code page UTF-8
+        (4, 30, person(rng).encode('utf-8')),
+        (7, 30, rng.choice(TEMPLATES).encode('utf-8')),
+        (8, 30, person(rng).encode('utf-8')),
+        (10, 64, rng.randrange(0, 3000) * 60 * 10 ** 7),
+        (12, 64, filetime(created)),
+        (13, 64, filetime(saved)),
+        (14, 3, rng.randrange(1, 80)),
+    ])
+    word_document = b'\xec\xa5' + filler_text(rng, size).encode('cp1250')
+    return compound_file([
+        ('WordDocument', word_document[:6_000_000]),
+        ('1Table', b'\x00' * 512),
+        ('\x05SummaryInformation', summary),
+    ])
+
+
+def pdf_date(value: datetime) -> bytes:
+    return value.strftime("D:%Y%m%d%H%M%S+01'00'").encode()
+
+
+def make_pdf(rng: random.Random, size: int) -> bytes:
+    created = random_datetime(rng)
+    modified = created + timedelta(minutes=rng.randrange(1, 5000))
+    pages = rng.randrange(1, 80)
+    content = b'BT /F1 12 Tf 72 720 Td (' + filler_text(rng, size).encode('latin-1', 'replace') + b') Tj ET'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count ' + str(pages).encode() + b' >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >>',
+        b'<< /Length ' + str(len(content)).encode() + b' >>\nstream\n' + content + b'\nendstream',
+        b'<< /Creator (' + rng.choice(CREATORS).encode('latin-1', 'replace') + b') /CreationDate ('
+        + pdf_date(created) + b') /ModDate (' + pdf_date(modified) + b') >>',
+    ]
+
+    output = bytearray(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode()
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 5 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return bytes(output)
+
+
+# Broken the way uploads break: cut off halfway, or garbage behind the right signature
+def corrupt(rng: random.Random, data: bytes) -> bytes:
+    if rng.random() < 0.5:
+        return data[:max(16, len(data) // 2)]
+    return data[:8] + rng.randbytes(len(data) - 8)
+
+
+GENERATORS = {
+    'docx': make_docx,
+    'doc': make_doc,
+    'pdf': make_pdf,
+}
+
+
+def file_name(rng: random.Random, index: int, filetype: str) -> str:
+    words = rng.sample(TITLE_WORDS, 2)
+    return unicodedata.normalize('NFC', f"{words[0].capitalize()} {words[1]} {index}.{filetype}")
+
+
+def ascii_name(name: str) -> str:
+    return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+
+
+# Files of one submission as (relative path, content)
+def submission_files(rng: random.Random, spec: CorpusSpec) -> List[Tuple[str, bytes]]:
+    files = []
+    for filetype in ('docx', 'doc', 'pdf'):
+        for index in range(getattr(spec, filetype)):
+            size = max(256, int(rng.gauss(spec.file_size, spec.file_size / 4)))
+            data = GENERATORS[filetype](rng, size)
+            if rng.random() < spec.corrupt:
+                data = corrupt(rng, data)
+            directories = [rng.choice(TITLE_WORDS) for _ in range(rng.randrange(spec.nesting + 1))]
+            files.append(('/'.join([*directories, file_name(rng, index, filetype)]), data))
+    return files
+
+
+def submission_name(index: int, rng: random.Random) -> str:
+    first, last = ascii_name(rng.choice(FIRST_NAMES)), ascii_name(rng.choice(LAST_NAMES))
+    return f"2021_{1000 + index:04d}_{first}_{last}_submission"
+
+
+# Writes dirs/ with a directory and zipped/ with an archive per submission, plus the spec as manifest.json.
+# Returns the number of files of each type written into each of the two trees.
+def generate_corpus(root: Path, spec: CorpusSpec) -> Dict[str, int]:
+    rng = random.Random(spec.seed)
+    dirs_root = root / 'dirs'
+    zipped_root = root / 'zipped'
+    dirs_root.mkdir(parents=True, exist_ok=True)
+    zipped_root.mkdir(parents=True, exist_ok=True)
+
+    counts = {'docx': 0, 'doc': 0, 'pdf': 0}
+    for index in range(spec.submissions):
+        name = submission_name(index, rng)
+        files = submission_files(rng, spec)
+        encoding = rng.choice(NAME_ENCODINGS)
+
+        with zipfile.ZipFile(zipped_root / f"{name}.zip", 'w', zipfile.ZIP_DEFLATED) as zf:
+            for relative_path, data in files:
+                counts[relative_path.rsplit('.', 1)[1]] += 1
+                target = dirs_root / name / relative_path
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+
+                if encoding == 'utf-8':
+                    zf.writestr(CorpusZipInfo(relative_path), data)
+                else:
+                    # Characters missing from the code page are dropped, as archivers of that era did
+                    legacy_path = relative_path.encode(encoding, 'ignore').decode(encoding)
+                    zf.writestr(CorpusZipInfo(legacy_path, encoding), data)
+
+    (root / 'manifest.json').write_text(json.dumps({'spec': spec._asdict(), 'files': counts}, indent=2))
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic submission corpus.")
+    parser.add_argument("output_dir", type=Path, help="Directory to generate the corpus in.")
+    defaults = CorpusSpec()
+    for field, default in defaults._asdict().items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    spec = CorpusSpec(**{field: getattr(args, field) for field in CorpusSpec._fields})
+    counts = generate_corpus(args.output_dir, spec)
+    print(f"Generated {spec.submissions} submissions with {counts} files in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+from benchmarks.corpus import CorpusSpec, generate_corpus
+from src.reading.extraction import close_source
+from src.reading.metadata import MetadataTable
+from src.reading.reading import (
+    collect_metadata_paths, iter_archive_members, read_metadata_from_doc, read_metadata_from_docx,
+    read_metadata_from_pdf, read_metadata_from_pdf_natively, READER_VERSION
+)
+from src.reading.simple_exiftool import ExifToolPool
+from src.report_writing import CsvReportWriter, HtmlReportWriter, JsonLinesReportWriter, write_report
+
+# Times the stages of an extraction on a synthetic corpus, offline and with exiftool only if installed:
+#   python -m benchmarks --submissions 200 --output results.json
+#   python -m benchmarks --corpus corpus_dir --baseline results.json --fail-on-regression
+
+# Relative change of throughput or p99 latency against the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.10
+
+
+class StageTiming(NamedTuple):
+    files: int
+    latencies: List[float]  # Seconds per timed item, a file or a submission, see STAGES
+
+
+# Each stage runs in a process of its own, so its peak RSS is not inflated by the stages before it.
+# Stages take the corpus root and whether exiftool is available, untimed setup stays outside `latencies`.
+
+def submission_dirs(root: Path) -> List[Path]:
+    return sorted((root / 'dirs').iterdir())
+
+
+def time_walk(root: Path, exiftool: bool) -> StageTiming:
+    files = 0
+    latencies = []
+    for subdir in submission_dirs(root):
+        started = time.perf_counter()
+        filetype_to_paths = collect_metadata_paths(subdir)
+        latencies.append(time.perf_counter() - started)
+        files += sum(len(paths) for paths in filetype_to_paths.values())
+    return StageTiming(files, latencies)
+
+
+def time_unzip(root: Path, exiftool: bool) -> StageTiming:
+    latencies = []
+    for archive in sorted((root / 'zipped').iterdir()):
+        started = time.perf_counter()
+        with zipfile.ZipFile(archive) as zf:
+            for _, _, data in iter_archive_members(zf, archive):
+                latencies.append(time.perf_counter() - started)
+                close_source(data)
+                started = time.perf_counter()
+    return StageTiming(len(latencies), latencies)
+
+
+def time_reader(root: Path, filetype: str, read: Callable) -> StageTiming:
+    paths = [path for subdir in submission_dirs(root) for path in collect_metadata_paths(subdir)[filetype]]
+    latencies = []
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            read(path)
+        except Exception as e:
+            # Corrupt files fail like they do for the callers of the readers
+            logging.debug(f"Reading {path} failed: {e}")
+        latencies.append(time.perf_counter() - started)
+    return StageTiming(len(paths), latencies)
+
+
+def time_docx(root: Path, exiftool: bool) -> StageTiming:
+    return time_reader(root, 'docx', read_metadata_from_docx)
+
+
+def time_doc(root: Path, exiftool: bool) -> StageTiming:
+    return time_reader(root, 'doc', read_metadata_from_doc)
+
+
+# Without exiftool only the native reader is timed, pdfs it cannot read stay empty
+def time_pdf(root: Path, exiftool: bool) -> StageTiming:
+    if not exiftool:
+        return time_reader(root, 'pdf', read_metadata_from_pdf_natively)
+
+    with ExifToolPool(1) as exif_tool:
+        # The exiftool process is started before timing, like the warm pool of a long run
+        exif_tool.execute("-ver")
+        return time_reader(root, 'pdf', lambda path: read_metadata_from_pdf(path, exif_tool))
+
+
+def time_report(root: Path, exiftool: bool) -> StageTiming:
+    submissions = []
+    for subdir in submission_dirs(root):
+        metadatas = MetadataTable()
+        filetype_to_paths = collect_metadata_paths(subdir)
+        for filetype, read in (('docx', read_metadata_from_docx), ('doc', read_metadata_from_doc)):
+            for path in filetype_to_paths[filetype]:
+                try:
+                    metadatas.append(read(path))
+                except Exception:
+                    pass
+        for path in filetype_to_paths['pdf']:
+            metadata = read_metadata_from_pdf_natively(path)
+            if metadata is not None:
+                metadatas.append(metadata)
+        submissions.append((subdir, metadatas))
+
+    files = 0
+    latencies = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        output_dir = Path(tempdir)
+        writers = [
+            HtmlReportWriter(output_dir / 'report.html'),
+            CsvReportWriter(output_dir / 'report.csv'),
+            JsonLinesReportWriter(output_dir / 'report.jsonl')
+        ]
+        started = time.perf_counter()
+        for writer in writers:
+            writer.__enter__()
+        for submission in submissions:
+            write_report([submission], writers)
+            latencies.append(time.perf_counter() - started)
+            files += len(submission[1])
+            started = time.perf_counter()
+        for writer in writers:
+            writer.__exit__(None, None, None)
+        latencies[-1] += time.perf_counter() - started
+    return StageTiming(files, latencies)
+
+
+# Stage name to its function and the item its latencies are measured for
+STAGES: Dict[str, tuple] = {
+    'walk': (time_walk, 'submission'),
+    'unzip': (time_unzip, 'file'),
+    'docx': (time_docx, 'file'),
+    'doc': (time_doc, 'file'),
+    'pdf': (time_pdf, 'file'),
+    'report': (time_report, 'submission'),
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+# Peak resident set size of this process in MiB, None where the resource module is missing
+def peak_rss_mib() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_stage(name: str, root: Path, exiftool: bool, log_level: str) -> Dict:
+    logging.getLogger().setLevel(log_level)
+    stage, unit = STAGES[name]
+    started = time.perf_counter()
+    timing = stage(root, exiftool)
+    seconds = time.perf_counter() - started
+    busy = sum(timing.latencies)
+    return {
+        'unit': unit,
+        'files': timing.files,
+        'items': len(timing.latencies),
+        'seconds': round(seconds, 6),
+        # Throughput over the timed work only, setup of the stage is left out
+        'files_per_sec': round(timing.files / busy, 3) if busy else None,
+        'p50_ms': round(percentile(timing.latencies, 0.50) * 1000, 4),
+        'p99_ms': round(percentile(timing.latencies, 0.99) * 1000, 4),
+        'peak_rss_mib': peak_rss_mib(),
+    }
+
+
+# Best of `repeat` runs of each stage, every run in a freshly spawned process
+def run_benchmarks(root: Path, stages: List[str], exiftool: bool, repeat: int, log_level: str) -> Dict[str, Dict]:
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name in stages:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(run_stage, name, root, exiftool, log_level).result())
+        results[name] = max(runs, key=lambda run: run['files_per_sec'] or 0)
+        logging.info(f"{name}: {results[name]}")
+    return results
+
+
+# Per stage change against a baseline result, positive throughput and negative latency changes are better
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> Dict[str, Dict]:
+    comparison = {}
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get('files_per_sec') or not result.get('files_per_sec'):
+            continue
+        throughput = result['files_per_sec'] / previous['files_per_sec'] - 1
+        p99 = result['p99_ms'] / previous['p99_ms'] - 1 if previous['p99_ms'] else 0.0
+        comparison[name] = {
+            'files_per_sec_change': round(throughput, 4),
+            'p99_change': round(p99, 4),
+            'regression': throughput < -tolerance or p99 > tolerance,
+        }
+    return comparison
+
+
+def environment(exiftool: bool) -> Dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'exiftool': exiftool,
+        'reader_version': READER_VERSION,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the extraction stages on a synthetic corpus.")
+
+    parser.add_argument(
+        "--corpus",
+        type=Path,
+        help="Corpus generated by benchmarks.corpus, a temporary one is generated from the spec options otherwise."
+    )
+
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Where to write the JSON results, they are printed otherwise."
+    )
+
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="JSON results of an earlier run to compare against."
+    )
+
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Relative slowdown against the baseline reported as a regression."
+    )
+
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Exit with status 1 if any stage regressed against the baseline."
+    )
+
+    parser.add_argument(
+        "--stage",
+        choices=list(STAGES),
+        action="append",
+        help="Stage to run (repeatable), all of them by default."
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs of each stage, the fastest one is reported."
+    )
+
+    parser.add_argument(
+        "--no-exiftool",
+        action="store_true",
+        help="Time only the native pdf reader even if exiftool is installed."
+    )
+
+    parser.add_argument(
+        "--log-level",
+        default="ERROR",
+        help="Logging level of the readers while they are timed."
+    )
+
+    defaults = CorpusSpec()
+    for field, default in defaults._asdict().items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    exiftool = not args.no_exiftool and shutil.which('exiftool') is not None
+    stages = args.stage or list(STAGES)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        root = args.corpus
+        if root is None:
+            root = Path(tempdir)
+            generate_corpus(root, CorpusSpec(**{field: getattr(args, field) for field in CorpusSpec._fields}))
+        manifest = json.loads((root / 'manifest.json').read_text())
+        results = run_benchmarks(root.resolve(), stages, exiftool, max(1, args.repeat), args.log_level)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(exiftool),
+        'corpus': manifest,
+        'stages': results,
+    }
+
+    regressed = False
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get('corpus') != manifest:
+            logging.warning(f"Baseline {args.baseline} was measured on another corpus")
+        report['comparison'] = compare(results, baseline.get('stages', {}), args.tolerance)
+        for name, change in report['comparison'].items():
+            logging.info(
+                f"{name}: {change['files_per_sec_change']:+.1%} files/sec, {change['p99_change']:+.1%} p99"
+                f"{' REGRESSION' if change['regression'] else ''}"
+            )
+            regressed |= change['regression']
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + '\n')
+        logging.info(f"Results written to {args.output}")
+    else:
+        print(text)
+
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,9 @@ import tempfile
 import unicodedata
 import xml.dom.minidom
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date
+from itertools import repeat
 from pathlib import Path
 from typing import List, Dict
 
@@ -429,25 +431,32 @@ def collect_from_zipped(path: Path) -> List[Metadata]:
             return read_metadata_recursively(tempdir_path)
 
 
-def collect_metadata(input_dir: Path, zipped) -> Dict[Path, List[Metadata]]:
-    dir_to_metadata = {}
-    for subdir in input_dir.iterdir():
-        metadatas = []
-        if zipped:
-            try:
-                metadatas = collect_from_zipped(subdir)
-            except Exception as e:
-                logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
-        else:
-            try:
-                metadatas = read_metadata_recursively(subdir)
-            except Exception as e:
-                logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
-        logging.info(f"Dir {subdir} has {len(metadatas)} metadatas")
+def collect_submission(subdir: Path, zipped) -> List[Metadata]:
+    metadatas = []
+    if zipped:
+        try:
+            metadatas = collect_from_zipped(subdir)
+        except Exception as e:
+            logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
+    else:
+        try:
+            metadatas = read_metadata_recursively(subdir)
+        except Exception as e:
+            logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
+    logging.info(f"Dir {subdir} has {len(metadatas)} metadatas")
+
+    return metadatas
+
 
-        dir_to_metadata[subdir] = metadatas
+def collect_metadata(input_dir: Path, zipped, jobs: int = 1) -> Dict[Path, List[Metadata]]:
+    subdirs = list(input_dir.iterdir())
+    if jobs <= 1:
+        return {subdir: collect_submission(subdir, zipped) for subdir in subdirs}
 
-    return dir_to_metadata
+    # Executor.map yields results in submission order, so the report matches a serial run
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(collect_submission, subdirs, repeat(zipped))
+        return dict(zip(subdirs, results))
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -485,6 +494,14 @@ def parse_args():
         help="Name of the output file (without extension)."
     )
 
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of worker processes extracting submissions in parallel (0 uses all CPUs)."
+    )
+
     return parser.parse_args()
 
 def validate_output_files(html_path: Path, csv_path: Path, force: bool, csv_required: bool):
@@ -509,7 +526,8 @@ def main():
 
     validate_output_files(html_output_path, csv_output_path, args.force, args.csv)
 
-    dir_to_metadata = collect_metadata(input_dir, args.zipped)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    dir_to_metadata = collect_metadata(input_dir, args.zipped, jobs)
     write_metadata_to_html(dir_to_metadata, html_output_path)
     if args.csv:
         write_metadata_to_csv(dir_to_metadata, csv_output_path)
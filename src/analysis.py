@@ -0,0 +1,181 @@
+import html
+import re
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, NamedTuple, TextIO, Tuple
+
+from src.constants import HTML_TABLE_STYLES
+from src.report_writing import (
+    ReportRow, ReportWriter, Submissions, WRITE_CHUNK_SIZE, get_submission_rows, iter_submissions
+)
+
+# Author names set by office suites and operating systems rather than by a person
+GENERIC_AUTHORS = {
+    '', 'user', 'admin', 'administrator', 'author', 'autor', 'pouzivatel', 'uzivatel', 'student', 'windows user',
+    'microsoft office user', 'office user', 'unknown', 'guest'
+}
+# Templates every word processor falls back to, normalized like the templates of the files
+DEFAULT_TEMPLATES = {'', 'normal', 'normal.dot', 'normal.dotm', 'normal.dotx', 'blank'}
+
+# How much a shared value of each kind says about submitters working together, see Overlap.score
+KIND_WEIGHTS = {
+    'author is another submitter': 4.0,
+    'created at the same time': 3.0,
+    'shared author': 2.0,
+    'shared template': 1.0,
+}
+# Values shared by more than this share of all submitters (and at least 3 of them) are common to the
+# whole class, e.g. a template handed out with the assignment, and not reported
+COMMON_SHARE = 0.25
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+# A value found in the files of more than one submitter. Files are (submitter, path) pairs.
+class Overlap(NamedTuple):
+    kind: str
+    value: str
+    submitters: List[str]
+    files: List[Tuple[str, Path]]
+
+    # Pairs score the full weight of their kind, every further submitter makes the value less telling
+    @property
+    def score(self) -> float:
+        return KIND_WEIGHTS[self.kind] / (len(self.submitters) - 1)
+
+
+# Case, accents, punctuation and word order do not matter: "Novák, Jan" and "jan novak" are one author
+def normalize_name(name: str | None) -> str:
+    if not name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', name.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(sorted(_NON_WORD.sub(' ', stripped).split()))
+
+
+# GENERIC_AUTHORS normalized like the authors of the files
+GENERIC_AUTHOR_NAMES = {normalize_name(author) for author in GENERIC_AUTHORS}
+
+
+def normalize_template(template: str | None) -> str:
+    if not template:
+        return ''
+    return re.split(r'[\\/]', template.strip())[-1].casefold()
+
+
+# Inverted indexes from normalized authors, templates and creation timestamps to the submitters and files
+# they occur in. Submissions are added one at a time and every file costs a constant number of dictionary
+# operations, so overlaps are found without comparing submissions pairwise.
+class OverlapIndex(object):
+
+    def __init__(self):
+        self.submitters: Dict[str, None] = {}
+        # Normalized names of the submitters, to tell when a file was written by another submitter
+        self.submitter_names: Dict[str, str] = {}
+        self.authors: Dict[str, Dict[str, Dict[Path, None]]] = {}
+        self.templates: Dict[str, Dict[str, Dict[Path, None]]] = {}
+        self.created: Dict[datetime, Dict[str, Dict[Path, None]]] = {}
+        # First spelling seen of every normalized value, shown in the report
+        self.spellings: Dict[Hashable, str] = {}
+
+    def add_submission(self, directory: Path, metadatas: Iterable):
+        self.add_rows(get_submission_rows(directory, metadatas))
+
+    def add_rows(self, rows: List[ReportRow]):
+        for row in rows:
+            self.submitters[row.submitter] = None
+            # Submitters are names only if SUBMITTER_REGEX matched their directory
+            if row.submitter != str(row.directory):
+                self.submitter_names.setdefault(normalize_name(row.submitter), row.submitter)
+
+            metadata = row.metadata
+            if metadata is None:
+                continue
+            for author in (metadata.creator, metadata.last_modified_by):
+                name = normalize_name(author)
+                if name not in GENERIC_AUTHOR_NAMES:
+                    self.add(self.authors, name, author, row.submitter, metadata.path)
+            template = normalize_template(metadata.template)
+            if template not in DEFAULT_TEMPLATES:
+                self.add(self.templates, template, metadata.template, row.submitter, metadata.path)
+            if metadata.date_created is not None:
+                self.add(self.created, metadata.date_created, metadata.date_created.isoformat(), row.submitter,
+                         metadata.path)
+
+    def add(self, index: Dict, key: Hashable, spelling: str, submitter: str, path: Path):
+        self.spellings.setdefault(key, spelling)
+        index.setdefault(key, {}).setdefault(submitter, {})[path] = None
+
+    # Overlaps of all submissions added so far, the most suspicious first
+    def overlaps(self) -> List[Overlap]:
+        common = max(3, COMMON_SHARE * len(self.submitters))
+        overlaps = []
+
+        def collect(kind: str, index: Dict):
+            for key, submitter_files in index.items():
+                if 1 < len(submitter_files) <= common:
+                    overlaps.append(overlap(kind, self.spellings[key], submitter_files))
+
+        collect('shared author', self.authors)
+        collect('shared template', self.templates)
+        collect('created at the same time', self.created)
+
+        # Files by an author who is a submitter of their own, found in the files of anyone else
+        for name, submitter_files in self.authors.items():
+            author = self.submitter_names.get(name)
+            others = {submitter: files for submitter, files in submitter_files.items() if submitter != author}
+            if author is not None and others:
+                overlaps.append(overlap('author is another submitter', author, {author: {}, **others}))
+
+        overlaps.sort(key=lambda item: (-item.score, -len(item.files), item.kind, item.value))
+        return overlaps
+
+
+def overlap(kind: str, value: str, submitter_files: Dict[str, Dict[Path, None]]) -> Overlap:
+    return Overlap(
+        kind,
+        value,
+        list(submitter_files),
+        [(submitter, path) for submitter, files in submitter_files.items() for path in files]
+    )
+
+
+# Analysis of the submissions collect_metadata returns
+def find_overlaps(dir_to_metadatas: Submissions) -> List[Overlap]:
+    index = OverlapIndex()
+    for directory, metadatas in iter_submissions(dir_to_metadatas):
+        index.add_submission(directory, metadatas)
+    return index.overlaps()
+
+
+# Builds the index from the rows of every submission as they are written and ranks the overlaps
+# once the run is complete
+class OverlapReportWriter(ReportWriter):
+
+    def __init__(self, output: Path | TextIO, chunk_size: int = WRITE_CHUNK_SIZE):
+        super().__init__(output, chunk_size)
+        self.index = OverlapIndex()
+
+    def write_rows(self, rows: List[ReportRow]):
+        self.index.add_rows(rows)
+
+    def write_footer(self):
+        self.write(
+            f"<html lang=sk><head>"
+            f"""<meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>"""
+            f"{HTML_TABLE_STYLES}"
+            f"<title>Suspicious Overlaps</title> </head> <body>"
+        )
+        self.write('<h1>Suspicious Overlaps</h1>\n')
+        self.write('<table><tr><th>Score</th><th>Overlap</th><th>Value</th><th>Submitters</th><th>Files</th></tr>\n')
+        for item in self.index.overlaps():
+            # Values come from the submitted files and their names, they are escaped like any untrusted text
+            files = '<br>'.join(f'{html.escape(submitter)}: {html.escape(str(path))}' for submitter, path in item.files)
+            submitters = ', '.join(html.escape(submitter) for submitter in item.submitters)
+            self.write(
+                f'<tr><td>{item.score:.2f}</td><td>{item.kind}</td><td>{html.escape(item.value)}</td>'
+                f'<td>{submitters}</td><td>{files}</td></tr>\n'
+            )
+        self.write('</table>\n')
+        self.write('</body></html>\n')
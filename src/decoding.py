@@ -1,22 +1,37 @@
-from src.constants import VALID_CHARACTERS_REGEX, SOURCE_ENCODINGS
+import functools
+import os
 import unicodedata
+from typing import Dict, Iterable
+from zipfile import ZipInfo
+
+from src.constants import VALID_CHARACTERS_REGEX, SOURCE_ENCODINGS
+
+# Zip general purpose flag of names stored in UTF-8, zipfile decodes all other names as cp437
+ZIP_UTF8_FLAG = 0x800
+
 
 def validate_decoded_filename(s: str) -> bool:
     return s and s.isprintable() and VALID_CHARACTERS_REGEX.match(s)
 
 
+# Authors, templates and file names repeat across a corpus, so their decoding is memoized
+@functools.lru_cache(maxsize=4096)
 def decode_from_eu_central(data: bytes) -> str | None:
     for encoding in SOURCE_ENCODINGS:
-        try:
-            decoded = data.decode(encoding)
-            normdecoded = unicodedata.normalize('NFC', decoded)
-            if validate_decoded_filename(normdecoded):
-                return normdecoded
-
-        except UnicodeDecodeError as ignore:
-            continue
+        decoded = decode_valid(data, encoding)
+        if decoded is not None:
+            return decoded
     return None
 
+
+def decode_valid(data: bytes, encoding: str) -> str | None:
+    try:
+        normdecoded = unicodedata.normalize('NFC', data.decode(encoding))
+    except UnicodeDecodeError:
+        return None
+    return normdecoded if validate_decoded_filename(normdecoded) else None
+
+
 def decode_nullable(data: bytes) -> str | None:
     if data:
         return decode_from_eu_central(data)
@@ -26,4 +41,46 @@ def decode_from_cp437(s: str) -> str | None:
     try:
         return decode_from_eu_central(s.encode('cp437'))
     except:
-        return None
\ No newline at end of file
+        return None
+
+
+# Decodes the member basenames of one archive. Names flagged as UTF-8 are taken as they are, all others
+# with the one source encoding that turns the most of them into valid names, earlier SOURCE_ENCODINGS
+# win ties. Names stay consistent within a submission, the few not valid in that encoding are decoded
+# one by one as decode_from_cp437 does. ASCII names decode the same in every encoding and are not scored.
+class ArchiveNameDecoder(object):
+
+    def __init__(self, members: Iterable[ZipInfo]):
+        legacy_names = dict.fromkeys(
+            os.path.basename(member.filename).encode('cp437') for member in members
+            if not member.flag_bits & ZIP_UTF8_FLAG
+        )
+        candidates = [name for name in legacy_names if not name.isascii()]
+
+        self.encoding: str | None = None
+        self._decoded: Dict[bytes, str] = {}
+        for encoding in SOURCE_ENCODINGS:
+            decoded = {}
+            for name in candidates:
+                valid = decode_valid(name, encoding)
+                if valid is not None:
+                    decoded[name] = valid
+
+            if len(decoded) > len(self._decoded):
+                self.encoding, self._decoded = encoding, decoded
+            # No later encoding can do better
+            if len(decoded) == len(candidates):
+                break
+
+    def decode(self, member: ZipInfo) -> str:
+        basename = os.path.basename(member.filename)
+        if member.flag_bits & ZIP_UTF8_FLAG:
+            return unicodedata.normalize('NFC', basename)
+        if basename.isascii():
+            return basename
+
+        raw = basename.encode('cp437')
+        decoded = self._decoded.get(raw)
+        if decoded is None:
+            decoded = self._decoded[raw] = decode_from_eu_central(raw) or basename
+        return decoded
@@ -1,69 +1,222 @@
 import argparse
+import asyncio
 import logging
+import multiprocessing.util
 import os
 import sys
-import tempfile
 import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Iterable, Iterator, Tuple, Deque
 from zipfile import ZipFile
 
-from src.decoding import decode_from_cp437
-from src.reading.reading import Metadata, read_metadata_recursively
-from src.report_writing import write_metadata_to_html, write_metadata_to_csv
+from src import instrumentation
+from src.analysis import OverlapReportWriter
+from src.journal import RunJournal, JournalMismatchError, merge_resumed, merge_resumed_async
+from src.reading import async_reading
+from src.reading.cache import MetadataCache, DEFAULT_CACHE_DIR
+from src.reading.dedup import ContentIndex
+from src.reading.extraction import ExtractionLimits, MiB, close_source
+from src.reading.metadata import Metadata, MetadataTable
+from src.reading.reading import (
+    filetype_buckets, read_metadata, read_metadata_recursively, iter_archive_members, READER_VERSION
+)
+from src.reading.simple_exiftool import ExifToolPool
+from src.reading.walking import PathFilter
+from src.report_writing import (
+    HtmlReportWriter, CsvReportWriter, JsonLinesReportWriter, ReportRow, ReportWriter, write_report,
+    write_report_async, write_report_rows
+)
+from src.watching import DEFAULT_RESCAN_INTERVAL, SubmissionWatcher, watch
 
 logging.getLogger().setLevel(logging.DEBUG)
 
-def collect_from_zipped(path: Path) -> List[Metadata]:
+# Exiftool pool, cache and content index owned by a worker process of the --jobs pool, see init_worker
+_worker_exif_tool: ExifToolPool | None = None
+_worker_cache: MetadataCache | None = None
+_worker_index: ContentIndex | None = None
+
+def collect_from_zipped(
+        path: Path,
+        exif_tool: ExifToolPool | None = None,
+        cache: MetadataCache | None = None,
+        path_filter: PathFilter | None = None,
+        limits: ExtractionLimits | None = None,
+        timeout: float | None = None,
+        index: ContentIndex | None = None
+) -> MetadataTable:
     if not zipfile.is_zipfile(path):
         logging.warning(f"Not a zip file: {path}")
-        return []
+        return MetadataTable()
 
-    with tempfile.TemporaryDirectory() as tempdir:
-        with zipfile.ZipFile(path, 'r') as zf:  # type: ZipFile
-            for member in zf.infolist(): # type ZipInfo
-                if member.is_dir():
-                    continue
+    archive_key = None
+    # Filtered listings of the same archive differ, only unfiltered ones are cached as a whole
+    if cache is not None and not path_filter:
+        archive_key = MetadataCache.file_key(path, 'zip')
+        cached = cache.get(archive_key)
+        if cached is not None:
+            instrumentation.count('archive_cache_hits')
+            return MetadataTable(Metadata.from_dict(value) for value in cached)
 
-                basename = os.path.basename(member.filename)
-                _, extension = os.path.splitext(member.filename)
+    # Members are read straight from the archive, grouped by type like read_metadata_recursively does
+    filetype_to_metadatas: Dict[str, List[Metadata]] = filetype_buckets()
+    with zipfile.ZipFile(path, 'r') as zf:  # type: ZipFile
+        for member_path, filetype, data in iter_archive_members(zf, path, path_filter, limits):
+            try:
+                metadata = read_metadata(member_path, exif_tool, data, cache, filetype, timeout, index, limits)
+                if metadata is not None:
+                    filetype_to_metadatas[filetype].append(metadata)
+            finally:
+                close_source(data)
 
-                if extension[1:].lower() in ['doc', 'docx', 'pdf']:
-                    decoded =  decode_from_cp437(basename)
-                    if decoded:
-                        target_path = f"{tempdir}/{decoded}"
-                    else:
-                        target_path = f"{tempdir}/{basename}"
+    metadatas = MetadataTable(metadata for metadatas in filetype_to_metadatas.values() for metadata in metadatas)
+    # Members that came out empty may have failed on a transient error, so they are not pinned
+    if archive_key and not any(metadata.is_empty() for metadata in metadatas):
+        cache.put(archive_key, [metadata.to_dict() for metadata in metadatas])
+    return metadatas
 
-                    with open(target_path, 'wb') as target:
-                        target.write(zf.read(member.filename))
 
-            tempdir_path = Path(tempdir)
-            return read_metadata_recursively(tempdir_path)
+def init_worker(
+        exiftool_workers: int,
+        cache: MetadataCache | None,
+        timeout: float | None = None,
+        stats: bool = False,
+        trace: Path | None = None,
+        dedup: bool = False
+):
+    global _worker_exif_tool, _worker_cache, _worker_index
+    if stats:
+        instrumentation.enable()
+    _worker_exif_tool = ExifToolPool(exiftool_workers, timeout=timeout).__enter__()
+    _worker_cache = cache
+    _worker_index = ContentIndex() if dedup else None
+    # Worker processes skip atexit, multiprocessing finalizers still run on their shutdown
+    multiprocessing.util.Finalize(
+        _worker_exif_tool, _worker_exif_tool.__exit__, args=(None, None, None), exitpriority=10
+    )
+    if cache is not None:
+        multiprocessing.util.Finalize(cache, cache.close, exitpriority=10)
+    if trace is not None:
+        instrumentation.enable_worker_trace(trace)
+        multiprocessing.util.Finalize(None, instrumentation.close_trace, exitpriority=5)
 
 
-def collect_metadata(input_dir: Path, zipped) -> Dict[Path, List[Metadata]]:
-    dir_to_metadata = {}
-    for subdir in input_dir.iterdir():
-        metadatas = []
+def collect_submission(
+        subdir: Path,
+        zipped,
+        exif_tool: ExifToolPool | None = None,
+        cache: MetadataCache | None = None,
+        path_filter: PathFilter | None = None,
+        limits: ExtractionLimits | None = None,
+        timeout: float | None = None,
+        index: ContentIndex | None = None
+) -> MetadataTable:
+    exif_tool = exif_tool or _worker_exif_tool
+    cache = cache or _worker_cache
+    index = index or _worker_index
+    metadatas = MetadataTable()
+    with instrumentation.span('submission', 'zip' if zipped else 'dir', label=subdir):
         if zipped:
             try:
-                metadatas = collect_from_zipped(subdir)
+                metadatas = collect_from_zipped(subdir, exif_tool, cache, path_filter, limits, timeout, index)
             except Exception as e:
                 logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
+                instrumentation.error('submission', e)
+                metadatas.failure = f"{type(e).__name__}: {e}"
         else:
             try:
-                metadatas = read_metadata_recursively(subdir)
+                metadatas = read_metadata_recursively(subdir, exif_tool, cache, path_filter, timeout, index, limits)
             except Exception as e:
                 logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
-        logging.info(f"Dir {subdir} has {len(metadatas)} metadatas")
+                instrumentation.error('submission', e)
+                metadatas.failure = f"{type(e).__name__}: {e}"
+    logging.info(f"Dir {subdir} has {len(metadatas)} metadatas")
+
+    return metadatas
+
+
+# Runs in a worker process of the --jobs pool, its stats since the last submission travel with the result
+def collect_in_worker(subdir: Path, zipped, *args) -> Tuple[MetadataTable, instrumentation.RunStats | None]:
+    return collect_submission(subdir, zipped, None, None, *args), instrumentation.drain()
+
+
+def iter_metadata(
+        input_dir: Path,
+        zipped,
+        jobs: int = 1,
+        exiftool_workers: int | None = None,
+        cache: MetadataCache | None = None,
+        path_filter: PathFilter | None = None,
+        limits: ExtractionLimits | None = None,
+        timeout: float | None = None,
+        subdirs: List[Path] | None = None,
+        dedup: bool = False
+) -> Iterator[Tuple[Path, MetadataTable]]:
+    if exiftool_workers is None:
+        exiftool_workers = max(1, os.cpu_count() // jobs)
+    # Only the given submissions of input_dir are read, e.g. the ones changed since the last poll of --watch
+    if subdirs is None:
+        subdirs = list(input_dir.iterdir())
+
+    # With `dedup` each process extracts every distinct content once, copies take over its metadata
+    if jobs <= 1:
+        index = ContentIndex() if dedup else None
+        with ExifToolPool(exiftool_workers, timeout=timeout) as exif_tool:
+            for subdir in subdirs:
+                yield subdir, collect_submission(
+                    subdir, zipped, exif_tool, cache, path_filter, limits, timeout, index
+                )
+        return
 
-        dir_to_metadata[subdir] = metadatas
+    # Submissions are yielded in input order, so the report matches a serial run. Only a small window
+    # of them is in flight, finished results never pile up in memory waiting for a slow consumer.
+    with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_worker,
+            initargs=(
+                exiftool_workers, cache, timeout, instrumentation.enabled(), instrumentation.trace_path(), dedup
+            )
+    ) as executor:
+        pending: Deque[Tuple[Path, Future]] = deque()
+        for subdir in subdirs:
+            pending.append((
+                subdir, executor.submit(collect_in_worker, subdir, zipped, path_filter, limits, timeout)
+            ))
+            if len(pending) >= 2 * jobs:
+                subdir, future = pending.popleft()
+                yield subdir, worker_result(future)
 
-    return dir_to_metadata
+        while pending:
+            subdir, future = pending.popleft()
+            yield subdir, worker_result(future)
+
+
+def worker_result(future: Future) -> MetadataTable:
+    metadatas, stats = future.result()
+    instrumentation.merge(stats)
+    return metadatas
+
+
+def collect_metadata(
+        input_dir: Path,
+        zipped,
+        jobs: int = 1,
+        exiftool_workers: int | None = None,
+        cache: MetadataCache | None = None,
+        path_filter: PathFilter | None = None,
+        limits: ExtractionLimits | None = None,
+        timeout: float | None = None,
+        dedup: bool = False
+) -> Dict[Path, MetadataTable]:
+    return dict(iter_metadata(
+        input_dir, zipped, jobs, exiftool_workers, cache, path_filter, limits, timeout, dedup=dedup
+    ))
 
 def parse_args():
     parser = argparse.ArgumentParser()
+    default_limits = ExtractionLimits()
 
     parser.add_argument(
         "input_dir",
@@ -98,34 +251,349 @@ def parse_args():
         help="Name of the output file (without extension)."
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        help="Glob pattern of submission files to read, relative to the submission (repeatable)."
+    )
+
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="Glob pattern of submission files or directories to skip (repeatable)."
+    )
+
+    parser.add_argument(
+        "--max-member-size",
+        type=int,
+        default=default_limits.max_member_size // MiB,
+        help="Largest uncompressed archive member read, in MiB."
+    )
+
+    parser.add_argument(
+        "--max-archive-size",
+        type=int,
+        default=default_limits.max_archive_size // MiB,
+        help="Most uncompressed bytes read from one archive, in MiB."
+    )
+
+    parser.add_argument(
+        "--max-compression-ratio",
+        type=float,
+        default=default_limits.max_ratio,
+        help="Highest compression ratio of archive members larger than 1 MiB."
+    )
+
+    parser.add_argument(
+        "--spool-size",
+        type=int,
+        default=default_limits.spool_size // MiB,
+        help="Archive members larger than this many MiB are spooled to disk instead of memory."
+    )
+
+    parser.add_argument(
+        "--file-timeout",
+        type=float,
+        default=60,
+        help="Seconds a single file may take to read before it is reported as timed out (0 waits indefinitely). "
+             "Exiftool is restarted and native reads of the serial and --jobs engines are interrupted after it. "
+             "With --async a native parser over it is reported right away but runs on in its executor thread."
+    )
+
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of worker processes extracting submissions in parallel (0 uses all CPUs)."
+    )
+
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Specify this flag to extract with the asyncio engine instead of worker processes."
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Number of files the asyncio engine reads at once."
+    )
+
+    parser.add_argument(
+        "--exiftool-workers",
+        type=int,
+        default=None,
+        help="Number of exiftool processes per worker (defaults to CPUs divided by jobs)."
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory of the extraction cache reused between runs."
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Specify this flag to neither read nor update the extraction cache."
+    )
 
-def validate_output_files(html_path: Path, csv_path: Path, force: bool, csv_required: bool):
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Specify this flag to extract every file again and overwrite its cache entry."
+    )
+
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Specify this flag to neither hash files nor extract copies of the same content only once."
+    )
+
+    parser.add_argument(
+        "--duplicates",
+        action="store_true",
+        help="Specify this flag to list files with the same content submitted by different submitters "
+             "at the end of the HTML report (not with --no-dedup)."
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Specify this flag to keep running and update the report whenever submissions are added or changed."
+    )
+
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between two polls of the input directory in watch mode."
+    )
+
+    parser.add_argument(
+        "--watch-rescan-interval",
+        type=float,
+        default=DEFAULT_RESCAN_INTERVAL,
+        help="Seconds between two polls in watch mode that also look for changes deep inside unchanged submissions."
+    )
+
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=None,
+        help="Journal of completed submissions kept during the run (defaults to the output name with .journal)."
+    )
+
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="Specify this flag to not keep a journal, an interrupted run then cannot be resumed."
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Specify this flag to continue an interrupted run from its journal, reading only the missing submissions."
+    )
+
+    parser.add_argument(
+        "--stats",
+        type=Path,
+        default=None,
+        help="Write counters, per stage timings, the slowest files and errors of the run to this JSON file."
+    )
+
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Write a span per submission, archive member and reader call to this Chrome trace file (see Perfetto)."
+    )
+
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Specify this flag if JSON Lines output with one object per file is required."
+    )
+
+    parser.add_argument(
+        "--overlaps",
+        action="store_true",
+        help="Specify this flag to also write a ranked report of authors, templates and creation times "
+             "shared by different submitters."
+    )
+
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Specify this flag to gzip the output files."
+    )
+
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Specify this flag to also stream one JSON object per file to stdout as submissions finish."
+    )
+
+    args = parser.parse_args()
+    if args.duplicates and args.no_dedup:
+        parser.error("--duplicates lists the content hashes of deduplication, it cannot be used with --no-dedup")
+    return args
+
+def validate_output_files(output_paths: List[Path], force: bool):
     if not force:
-        if html_path.exists():
-            print(f"HTML output file already exists: {html_path}")
-            sys.exit(1)
-        if csv_required and csv_path.exists():
-            print(f"CSV output file already exists: {csv_path}")
-            sys.exit(1)
+        for output_path in output_paths:
+            if output_path.exists():
+                print(f"Output file already exists: {output_path}")
+                sys.exit(1)
+
+def create_writers(args) -> List[ReportWriter]:
+    # Output paths ending in .gz are compressed by the writers
+    suffix = ".gz" if args.gzip else ""
+    writers = [HtmlReportWriter(Path(f"{args.output_name}.html{suffix}"), duplicates=args.duplicates)]
+    if args.csv:
+        writers.append(CsvReportWriter(Path(f"{args.output_name}.csv{suffix}")))
+    if args.jsonl:
+        writers.append(JsonLinesReportWriter(Path(f"{args.output_name}.jsonl{suffix}")))
+    if args.overlaps:
+        writers.append(OverlapReportWriter(Path(f"{args.output_name}_overlaps.html{suffix}")))
+    return writers
+
+
+def write_to(writers: List[ReportWriter], submissions: Iterable[Tuple[Path, MetadataTable]]):
+    with ExitStack() as stack:
+        for writer in writers:
+            stack.enter_context(writer)
+        write_report(submissions, writers)
+
+
+def write_rows_to(writers: List[ReportWriter], submission_rows: Iterable[List[ReportRow]]):
+    with ExitStack() as stack:
+        for writer in writers:
+            stack.enter_context(writer)
+        write_report_rows(submission_rows, writers)
+
+
+async def collect_async(submissions: AsyncIterator[Tuple[Path, MetadataTable]]) -> List[Tuple[Path, MetadataTable]]:
+    return [submission async for submission in submissions]
+
 
 def main():
     args = parse_args()
 
-    html_output_path = Path(f"{args.output_name}.html")
-    csv_output_path = Path(f"{args.output_name}.csv")
-
     input_dir = args.input_dir
     if not input_dir.exists() or not input_dir.is_dir():
         print(f"The path provided does not exist or is not a directory: {input_dir}")
         sys.exit(1)
 
-    validate_output_files(html_output_path, csv_output_path, args.force, args.csv)
+    writers = create_writers(args)
+    # A resumed run replaces the reports of the run it continues
+    validate_output_files([writer.output for writer in writers], args.force or args.resume)
+    if args.ndjson:
+        writers.append(JsonLinesReportWriter(sys.stdout, flush_submissions=True))
 
-    dir_to_metadata = collect_metadata(input_dir, args.zipped)
-    write_metadata_to_html(dir_to_metadata, html_output_path)
-    if args.csv:
-        write_metadata_to_csv(dir_to_metadata, csv_output_path)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    cache = None
+    if not args.no_cache:
+        cache = MetadataCache(args.cache_dir, READER_VERSION, refresh=args.refresh_cache)
+        # Opened up front, so a cache that cannot be used is reported once rather than by every worker
+        if cache.connection is None:
+            cache = None
+
+    path_filter = PathFilter(args.include, args.exclude)
+    limits = ExtractionLimits(
+        max_member_size=args.max_member_size * MiB,
+        max_archive_size=args.max_archive_size * MiB,
+        max_ratio=args.max_compression_ratio,
+        spool_size=args.spool_size * MiB
+    )
+    timeout = args.file_timeout or None
+    dedup = not args.no_dedup
+    if args.stats:
+        instrumentation.enable()
+    if args.trace:
+        instrumentation.enable_trace(args.trace)
+
+    if args.watch:
+        def extract(subdirs: List[Path]) -> List[Tuple[Path, MetadataTable]]:
+            if args.use_async:
+                return asyncio.run(collect_async(async_reading.iter_metadata(
+                    input_dir, args.zipped, args.concurrency, args.exiftool_workers, cache, path_filter, limits,
+                    timeout, subdirs=subdirs, dedup=dedup
+                )))
+            return list(iter_metadata(
+                input_dir, args.zipped, jobs, args.exiftool_workers, cache, path_filter, limits, timeout, subdirs,
+                dedup
+            ))
+
+        # Reports are written anew on every update, --ndjson only streams the submissions just extracted
+        stream = (lambda submissions: write_to(writers[-1:], submissions)) if args.ndjson else None
+        try:
+            watch(
+                SubmissionWatcher(input_dir, path_filter, args.watch_rescan_interval),
+                extract,
+                lambda submission_rows: write_rows_to(create_writers(args), submission_rows),
+                args.watch_interval,
+                stream
+            )
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")
+    else:
+        journal = None
+        if not args.no_journal:
+            journal_path = args.journal or Path(f"{args.output_name}.journal")
+            journal = RunJournal(journal_path, input_dir, args.zipped, READER_VERSION, args.include, args.exclude)
+            writers.append(journal)
+
+        completed = {}
+        if args.resume:
+            if journal is None:
+                print("Resuming needs the journal, --resume and --no-journal exclude each other")
+                sys.exit(1)
+            try:
+                completed = journal.load()
+            except JournalMismatchError as e:
+                print(e)
+                sys.exit(1)
+
+        subdirs = list(input_dir.iterdir())
+        pending = [subdir for subdir in subdirs if subdir.name not in completed]
+
+        # Every submission goes to all writers in one pass as soon as it is extracted, nothing is collected up front
+        with ExitStack() as stack:
+            for writer in writers:
+                stack.enter_context(writer)
+            if args.use_async:
+                asyncio.run(write_report_async(merge_resumed_async(subdirs, completed, async_reading.iter_metadata(
+                    input_dir, args.zipped, args.concurrency, args.exiftool_workers, cache, path_filter, limits,
+                    timeout, subdirs=pending, dedup=dedup
+                )), writers))
+            else:
+                write_report(merge_resumed(subdirs, completed, iter_metadata(
+                    input_dir, args.zipped, jobs, args.exiftool_workers, cache, path_filter, limits, timeout, pending,
+                    dedup
+                )), writers)
+
+        # The reports are complete, there is nothing left to resume
+        if journal is not None:
+            journal.remove()
+
+    if cache is not None:
+        cache.evict()
+        cache.close()
+
+    if args.stats:
+        instrumentation.write_stats(args.stats)
+        print(f"Stats written to {args.stats}", file=sys.stderr)
+    if args.trace:
+        instrumentation.finish_trace()
+        print(f"Trace written to {args.trace}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
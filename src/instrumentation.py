@@ -0,0 +1,371 @@
+import asyncio
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Upper bounds of the latency histogram buckets in seconds, the last bucket takes everything slower
+HISTOGRAM_BOUNDS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+SLOWEST_FILES = 20
+# Trace events held in memory per process before they are written out
+TRACE_BUFFER_SIZE = 10_000
+
+
+class StageStats(object):
+    __slots__ = ('count', 'seconds', 'max_seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+
+    def merge(self, other: 'StageStats'):
+        self.count += other.count
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+
+    # Upper bound of the bucket holding the given share of the observations
+    def quantile_bound(self, fraction: float) -> float | None:
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_dict(self) -> Dict:
+        bound_p50, bound_p99 = self.quantile_bound(0.50), self.quantile_bound(0.99)
+        return {
+            'count': self.count,
+            'seconds': round(self.seconds, 6),
+            'mean_ms': round(self.seconds / self.count * 1000, 3) if self.count else None,
+            'max_ms': round(self.max_seconds * 1000, 3),
+            'p50_le_ms': bound_p50 * 1000 if bound_p50 is not None else None,
+            'p99_le_ms': bound_p99 * 1000 if bound_p99 is not None else None,
+            # Per worker rate, the run as a whole may be faster with several of them
+            'per_sec': round(self.count / self.seconds, 3) if self.seconds else None,
+            'histogram': {
+                **{f"<={bound * 1000:g}ms": count for bound, count in zip(HISTOGRAM_BOUNDS, self.buckets)},
+                f">{HISTOGRAM_BOUNDS[-1] * 1000:g}ms": self.buckets[-1]
+            },
+        }
+
+
+def stage_order(item: Tuple[Tuple[str, str | None], StageStats]) -> Tuple[str, str]:
+    (stage, filetype), _ = item
+    return stage, filetype or ''
+
+
+# Counters, latency histograms by stage and format, the slowest files and errors by cause of one process.
+# Worker processes hand theirs over with drain, the main process merges them into its own.
+class RunStats(object):
+
+    def __init__(self, slowest: int = SLOWEST_FILES):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.slowest_size = slowest
+        self.stages: Dict[Tuple[str, str | None], StageStats] = {}
+        self.counters: Dict[str, int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        # Min-heap of (seconds, stage, filetype, path), the fastest of the slowest is replaced first
+        self.slowest: List[Tuple[float, str, str | None, str]] = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, filetype: str | None, seconds: float, path=None):
+        with self._lock:
+            stats = self.stages.get((stage, filetype))
+            if stats is None:
+                stats = self.stages[(stage, filetype)] = StageStats()
+            stats.observe(seconds)
+            if path is not None:
+                self.keep_slowest((seconds, stage, filetype, str(path)))
+
+    def keep_slowest(self, entry: Tuple[float, str, str | None, str]):
+        if len(self.slowest) < self.slowest_size:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def error(self, stage: str, cause: str):
+        with self._lock:
+            self.errors[(stage, cause)] = self.errors.get((stage, cause), 0) + 1
+
+    def merge(self, other: 'RunStats'):
+        with self._lock:
+            for key, stats in other.stages.items():
+                self.stages.setdefault(key, StageStats()).merge(stats)
+            for name, amount in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+            for key, amount in other.errors.items():
+                self.errors[key] = self.errors.get(key, 0) + amount
+            for entry in other.slowest:
+                self.keep_slowest(entry)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            stages: Dict[str, Dict] = {}
+            for (stage, filetype), stats in sorted(self.stages.items(), key=stage_order):
+                stages.setdefault(stage, {})[filetype or 'all'] = stats.to_dict()
+            errors: Dict[str, Dict[str, int]] = {}
+            for (stage, cause), amount in sorted(self.errors.items()):
+                errors.setdefault(stage, {})[cause] = amount
+            return {
+                'wall_seconds': round(time.time() - self.started, 3),
+                'stages': stages,
+                'counters': dict(sorted(self.counters.items())),
+                'errors': errors,
+                'slowest': [
+                    {'path': path, 'stage': stage, 'filetype': filetype, 'ms': round(seconds * 1000, 3)}
+                    for seconds, stage, filetype, path in sorted(self.slowest, reverse=True)
+                ],
+            }
+
+
+# Chrome trace events of one process, viewable in Perfetto or chrome://tracing. Events are buffered up to
+# `buffer_size` and then appended to a part file of the process as one JSON object per line, so memory
+# stays bounded however long the run. finish_trace joins the parts of all processes into the trace.
+class TraceWriter(object):
+
+    def __init__(self, path: Path, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self.events: List[str] = []
+        self.tracks: Dict[int, int] = {}
+        self.file = open(trace_part_path(path, self.pid), 'w', encoding='utf-8')
+        self.add({
+            'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+            'args': {'name': f"{'main' if multiprocessing.parent_process() is None else 'worker'} {self.pid}"}
+        })
+
+    # Coroutines of one event loop overlap on its thread, each task gets a track of its own
+    def track(self) -> Tuple[int, str]:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            return id(task), f"task {task.get_name()}"
+        thread = threading.current_thread()
+        return thread.ident, thread.name
+
+    def add(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self.events.append(line)
+            if len(self.events) >= self.buffer_size:
+                self.flush()
+
+    def add_span(self, span: 'Span', seconds: float, exc_type):
+        track, track_name = self.track()
+        with self._lock:
+            if track not in self.tracks:
+                # Track ids are kept small, threads and tasks of a process are numbered as they appear
+                self.tracks[track] = len(self.tracks) + 1
+                self.events.append(json.dumps({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': self.tracks[track],
+                    'args': {'name': track_name}
+                }))
+            tid = self.tracks[track]
+
+        args = {}
+        if span.path is not None or span.label is not None:
+            args['path'] = str(span.path if span.path is not None else span.label)
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        self.add({
+            'name': f"{span.stage} {span.filetype}" if span.filetype else span.stage,
+            'cat': span.stage,
+            'ph': 'X',
+            'ts': span.wall_started // 1000,
+            'dur': round(seconds * 1_000_000),
+            'pid': self.pid,
+            'tid': tid,
+            'args': args
+        })
+
+    # Called with the lock held or once no other thread adds events
+    def flush(self):
+        if self.events:
+            self.file.write('\n'.join(self.events) + '\n')
+            self.events.clear()
+        self.file.flush()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.file.close()
+
+
+def trace_part_path(path: Path, pid: int) -> Path:
+    return path.with_name(f".{path.stem}.{pid}.part{path.suffix}")
+
+
+# Times the block as an observation of `stage` for files of `filetype` and as a trace event, see span
+class Span(object):
+    __slots__ = ('stage', 'filetype', 'path', 'label', 'started', 'wall_started')
+
+    def __init__(self, stage: str, filetype: str | None, path, label):
+        self.stage = stage
+        self.filetype = filetype
+        self.path = path
+        self.label = label
+
+    def __enter__(self):
+        # Trace timestamps come from the wall clock, which all processes share
+        self.wall_started = time.time_ns()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.started
+        if _stats is not None:
+            _stats.observe(self.stage, self.filetype, seconds, self.path)
+            if exc_type is not None:
+                _stats.error(self.stage, exc_type.__name__)
+        if _trace is not None:
+            _trace.add_span(self, seconds, exc_type)
+        return False
+
+
+class NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+# Stats and trace of this process, None while disabled, which is the default
+_stats: RunStats | None = None
+_trace: TraceWriter | None = None
+
+
+# Starts collecting anew, forked worker processes drop the stats they inherited this way
+def enable(slowest: int = SLOWEST_FILES):
+    global _stats
+    _stats = RunStats(slowest)
+
+
+def enabled() -> bool:
+    return _stats is not None
+
+
+# Starts tracing into `path`, in the main process before any worker is started. Parts left behind by
+# an earlier run that never finished are removed first.
+def enable_trace(path: Path):
+    for stale_part in path.parent.glob(f".{path.stem}.*.part{path.suffix}"):
+        stale_part.unlink(missing_ok=True)
+    enable_worker_trace(path)
+
+
+# Starts tracing into a part of `path` of its own, in worker processes. Events inherited by a fork are
+# dropped unwritten, the process they were recorded in writes them.
+def enable_worker_trace(path: Path):
+    global _trace
+    _trace = TraceWriter(path)
+
+
+def trace_path() -> Path | None:
+    return _trace.path if _trace is not None else None
+
+
+# Writes out what is left of the trace of a worker process, on its exit
+def close_trace():
+    if _trace is not None:
+        _trace.close()
+
+
+# Joins the parts of all processes into the trace as a JSON array, after the workers have exited
+def finish_trace():
+    global _trace
+    if _trace is None:
+        return
+    path = _trace.path
+    _trace.close()
+    _trace = None
+
+    parts = sorted(path.parent.glob(f".{path.stem}.*.part{path.suffix}"))
+    with open(path, 'w', encoding='utf-8') as trace_file:
+        trace_file.write('[\n')
+        separator = ''
+        for part in parts:
+            with open(part, encoding='utf-8') as part_file:
+                for line in part_file:
+                    trace_file.write(separator + line.rstrip('\n'))
+                    separator = ',\n'
+        trace_file.write('\n]\n')
+    for part in parts:
+        part.unlink()
+
+
+# Disabled, this is a global lookup and a shared no-op context manager, cheap enough for every file.
+# Spans with a `path` compete for the slowest files, a `label` only names the span in the trace.
+def span(stage: str, filetype: str | None = None, path=None, label=None) -> Span | NoSpan:
+    if _stats is None and _trace is None:
+        return NO_SPAN
+    return Span(stage, filetype, path, label)
+
+
+def count(name: str, amount: int = 1):
+    if _stats is not None:
+        _stats.count(name, amount)
+
+
+# `cause` is an exception, counted by its type, or a short description
+def error(stage: str, cause: BaseException | str):
+    if _stats is not None:
+        _stats.error(stage, cause if isinstance(cause, str) else type(cause).__name__)
+
+
+# Stats gathered since the last drain, handed from a worker process to the main one, None if disabled
+def drain() -> RunStats | None:
+    global _stats
+    if _stats is None:
+        return None
+    stats, _stats = _stats, RunStats(_stats.slowest_size)
+    return stats
+
+
+def merge(stats: RunStats | None):
+    if _stats is not None and stats is not None:
+        _stats.merge(stats)
+
+
+def write_stats(path: Path):
+    if _stats is None:
+        return
+    with open(path, 'w', encoding='utf-8') as stats_file:
+        json.dump(_stats.to_dict(), stats_file, indent=2, ensure_ascii=False)
+        stats_file.write('\n')
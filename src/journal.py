@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from src.reading.metadata import Metadata, MetadataTable
+from src.report_writing import ReportRow, ReportWriter
+
+JOURNAL_VERSION = 2
+
+
+class JournalMismatchError(Exception):
+    pass
+
+
+# Append-only record of the submissions a run has completed, one JSON line each, written through to disk
+# as soon as a submission reaches the writers. The first line names the run, a journal is only resumed
+# by the same run. A line cut short by a crash is ignored and its submission extracted again, like the
+# submissions that failed as a whole.
+class RunJournal(ReportWriter):
+
+    def __init__(
+            self,
+            path: Path,
+            input_dir: Path,
+            zipped: bool,
+            reader_version: int,
+            include: Sequence[str] | None = (),
+            exclude: Sequence[str] | None = ()
+    ):
+        super().__init__(path)
+        self.path = path
+        self.header = {
+            'journal': JOURNAL_VERSION,
+            'input_dir': str(input_dir.resolve()),
+            'zipped': bool(zipped),
+            'reader_version': reader_version,
+            'include': list(include or ()),
+            'exclude': list(exclude or ())
+        }
+        self.completed: Dict[str, MetadataTable] = {}
+
+    # Completed submissions of an earlier run by their name, in the order they were completed
+    def load(self) -> Dict[str, MetadataTable]:
+        self.completed = {}
+        if not self.path.exists():
+            return self.completed
+
+        with open(self.path, encoding='utf-8') as journal_file:
+            lines = iter(journal_file)
+            try:
+                header = json.loads(next(lines, 'null'))
+            except json.JSONDecodeError:
+                # The run crashed while starting, before it completed anything
+                logging.warning(f"Ignoring the incomplete header of {self.path}")
+                return self.completed
+            if header is None:
+                return self.completed
+            if header != self.header:
+                raise JournalMismatchError(f"Journal {self.path} belongs to another run: {header}")
+
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignoring an incomplete journal entry in {self.path}")
+                    continue
+                if entry['status'] == 'failed':
+                    continue
+                self.completed[entry['submission']] = MetadataTable(
+                    Metadata.from_dict(value) for value in entry['metadata']
+                )
+
+        logging.info(f"Resuming {len(self.completed)} submissions from {self.path}")
+        return self.completed
+
+    def __enter__(self):
+        # A resumed journal is continued, any other one started anew
+        resumed = bool(self.completed)
+        if resumed:
+            truncate_partial_line(self.path)
+        self.file = open(self.path, 'a' if resumed else 'w', encoding='utf-8')
+        if not resumed:
+            self.write(json.dumps(self.header) + '\n')
+            self.sync()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sync()
+        self.file.close()
+
+    def sync(self):
+        self.flush()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def write_rows(self, rows: List[ReportRow]):
+        name = rows[0].directory.name
+        if name in self.completed:
+            return
+
+        metadatas = [row.metadata for row in rows if row.metadata is not None]
+        errors = sum(1 for metadata in metadatas if metadata.error)
+        failure = rows[0].failure
+        self.write(json.dumps({
+            'submission': name,
+            'status': 'failed' if failure else 'errors' if errors else 'ok',
+            'errors': errors,
+            'failure': failure,
+            'metadata': [metadata.to_dict() for metadata in metadatas]
+        }, ensure_ascii=False) + '\n')
+        self.sync()
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+
+# Drops what follows the last newline of `path`, a line cut short by a crash would swallow the next entry
+def truncate_partial_line(path: Path, chunk_size: int = 64 * 1024):
+    with open(path, 'rb+') as journal_file:
+        end = journal_file.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - chunk_size)
+            journal_file.seek(start)
+            newline = journal_file.read(end - start).rfind(b'\n')
+            if newline != -1:
+                journal_file.truncate(start + newline + 1)
+                return
+            end = start
+        journal_file.truncate(0)
+
+
+# Submissions of `subdirs` in their order, completed ones from the journal and the rest from `extracted`,
+# which yields exactly the missing ones in the same order
+def merge_resumed(
+        subdirs: List[Path],
+        completed: Dict[str, MetadataTable],
+        extracted: Iterable[Tuple[Path, MetadataTable]]
+) -> Iterator[Tuple[Path, MetadataTable]]:
+    extracted = iter(extracted)
+    for subdir in subdirs:
+        if subdir.name in completed:
+            yield subdir, completed[subdir.name]
+        else:
+            yield next(extracted)
+    # Lets the extraction finish, it has nothing left to yield
+    for _ in extracted:
+        pass
+
+
+async def merge_resumed_async(
+        subdirs: List[Path],
+        completed: Dict[str, MetadataTable],
+        extracted: AsyncIterable[Tuple[Path, MetadataTable]]
+) -> AsyncIterator[Tuple[Path, MetadataTable]]:
+    extracted = aiter(extracted)
+    for subdir in subdirs:
+        if subdir.name in completed:
+            yield subdir, completed[subdir.name]
+        else:
+            yield await anext(extracted)
+    async for _ in extracted:
+        pass
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Deque, Dict, List, Tuple
+
+from src import instrumentation
+from .cache import MetadataCache
+from .dedup import ContentIndex, hash_source
+from .extraction import ExtractionLimits, SpooledSource, close_source
+from .metadata import Metadata, MetadataTable
+from .reading import (
+    PDF_TAGS, cache_value, collect_metadata_paths, filetype_buckets, iter_archive_members, metadata_cache_key,
+    read_cached_metadata,
+    read_metadata_by_filetype, read_docx_or_none, read_metadata_from_pdf_natively, pdf_metadata_from_exif,
+    timed_out
+)
+from .simple_exiftool import AsyncExifToolPool
+from .walking import PathFilter
+
+
+# Extraction that never blocks the event loop. Walking, archive reading and parsing run in `executor`,
+# the default executor of the loop if None, while pdf files the native reader cannot parse wait on
+# exiftool over asyncio pipes. At most `concurrency` files are parsed at once.
+class AsyncExtractor(object):
+
+    def __init__(
+            self,
+            exif_tool: AsyncExifToolPool,
+            concurrency: int = 8,
+            cache: MetadataCache | None = None,
+            path_filter: PathFilter | None = None,
+            executor: Executor | None = None,
+            limits: ExtractionLimits | None = None,
+            timeout: float | None = None,
+            index: ContentIndex | None = None
+    ):
+        self.exif_tool = exif_tool
+        self.limit = asyncio.Semaphore(concurrency)
+        self.cache = cache
+        self.path_filter = path_filter
+        self.executor = executor
+        self.limits = limits
+        self.timeout = timeout
+        self.index = index
+
+    async def run(self, function: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def collect_submission(self, subdir: Path, zipped) -> MetadataTable:
+        metadatas = MetadataTable()
+        with instrumentation.span('submission', 'zip' if zipped else 'dir', label=subdir):
+            try:
+                if zipped:
+                    metadatas = await self.collect_from_zipped(subdir)
+                else:
+                    metadatas = await self.collect_from_directory(subdir)
+            except Exception as e:
+                logging.error(f"Was not able to extract metadata for {subdir}: \n{e}")
+                instrumentation.error('submission', e)
+                metadatas.failure = f"{type(e).__name__}: {e}"
+        logging.info(f"Dir {subdir} has {len(metadatas)} metadatas")
+
+        return metadatas
+
+    async def collect_from_directory(self, path: Path) -> MetadataTable:
+        if not await self.run(path.is_dir):
+            logging.warning(f"Path is not a directory: {path}")
+            return MetadataTable()
+
+        filetype_to_paths = await self.run(collect_metadata_paths, path, self.path_filter, self.cache)
+        # All files are read at once and ordered by type afterwards, like read_metadata_recursively does
+        files = [
+            (file_path, filetype) for filetype, paths in filetype_to_paths.items() for file_path in paths
+        ]
+        results = await asyncio.gather(*(self.read_file(file_path, filetype) for file_path, filetype in files))
+        return MetadataTable(metadata for metadata in results if metadata is not None)
+
+    async def collect_from_zipped(self, path: Path) -> MetadataTable:
+        if not await self.run(zipfile.is_zipfile, path):
+            logging.warning(f"Not a zip file: {path}")
+            return MetadataTable()
+
+        archive_key = None
+        if self.cache is not None and not self.path_filter:
+            archive_key = await self.run(MetadataCache.file_key, path, 'zip')
+            cached = await self.run(self.cache.get, archive_key)
+            if cached is not None:
+                instrumentation.count('archive_cache_hits')
+                return MetadataTable(Metadata.from_dict(value) for value in cached)
+
+        # Unlike the blocking reader, all extracted members of the archive are held while they are read
+        members = await self.run(read_archive_members, path, self.path_filter, self.limits)
+        try:
+            results = await asyncio.gather(*(
+                self.read_file(member_path, filetype, data) for member_path, filetype, data in members
+            ))
+        finally:
+            for _, _, data in members:
+                close_source(data)
+
+        filetype_to_metadatas: Dict[str, List[Metadata]] = filetype_buckets()
+        for (_, filetype, _), metadata in zip(members, results):
+            if metadata is not None:
+                filetype_to_metadatas[filetype].append(metadata)
+
+        metadatas = MetadataTable(metadata for metadatas in filetype_to_metadatas.values() for metadata in metadatas)
+        if archive_key and not any(metadata.is_empty() for metadata in metadatas):
+            await self.run(self.cache.put, archive_key, [metadata.to_dict() for metadata in metadatas])
+        return metadatas
+
+    # None for unreadable docx files, which read_metadata_recursively and read_metadata leave out as well.
+    # Parsing over its time budget cannot be interrupted in the executor, only its result is dropped.
+    async def read_file(self, file_path: Path, filetype: str, source: bytes | None = None) -> Metadata | None:
+        async with self.limit:
+            try:
+                metadata, cache_key, content_hash = await asyncio.wait_for(
+                    self.run(self.read_natively, file_path, filetype, source), self.timeout
+                )
+            except asyncio.TimeoutError:
+                return timed_out(file_path, self.timeout)
+
+        if metadata is None and filetype == 'pdf':
+            metadata = await self.read_pdf_with_exiftool(file_path, source)
+            metadata.content_hash = content_hash
+            if cache_key and not metadata.is_empty():
+                await self.run(self.cache.put, cache_key, cache_value(metadata, filetype))
+            if self.index is not None:
+                self.index.put(content_hash, metadata)
+        return metadata
+
+    # Runs in the executor, pdf files for exiftool come back as None. Copies of content read before are
+    # taken from the index like read_metadata does, also with the hash of the content.
+    def read_natively(
+            self, file_path: Path, filetype: str, source: bytes | None = None
+    ) -> Tuple[Metadata | None, str | None, str | None]:
+        content_hash = None
+        if self.index is not None:
+            content_hash = hash_source(file_path, source)
+            duplicate = self.index.get(content_hash, file_path)
+            if duplicate is not None:
+                instrumentation.count('duplicates_skipped')
+                return duplicate, None, content_hash
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = metadata_cache_key(file_path, filetype, source, content_hash)
+            cached = read_cached_metadata(self.cache, cache_key, file_path)
+            if cached is not None:
+                cached.content_hash = content_hash or cached.content_hash
+                return cached, None, content_hash
+
+        if filetype == 'pdf':
+            metadata = read_metadata_from_pdf_natively(file_path, source)
+        elif filetype == 'docx':
+            metadata = read_docx_or_none(file_path, source, self.limits)
+        else:
+            metadata = read_metadata_by_filetype(file_path, filetype, None, source, self.limits)
+
+        if metadata is not None:
+            metadata.content_hash = content_hash
+            if self.index is not None:
+                self.index.put(content_hash, metadata)
+        if cache_key and metadata is not None and not metadata.is_empty():
+            self.cache.put(cache_key, cache_value(metadata, filetype))
+        return metadata, cache_key, content_hash
+
+    async def read_pdf_with_exiftool(self, path: Path, source: bytes | None = None) -> Metadata:
+        try:
+            with instrumentation.span('exiftool', 'pdf', path):
+                if source is None:
+                    exif_data, = await self.exif_tool.get_metadata_many([str(path)], PDF_TAGS)
+                else:
+                    # Exiftool needs a file on disk
+                    with tempfile.TemporaryDirectory() as tempdir:
+                        exif_path = os.path.join(tempdir, 'source.pdf')
+                        await self.run(write_file, exif_path, source)
+                        exif_data, = await self.exif_tool.get_metadata_many([exif_path], PDF_TAGS)
+        except Exception as e:
+            logging.error(f"Error extracting metadata from pdf format, "
+                          f"perhaps Exiftool is not installed.\n"
+                          f"Cause: {e}"
+            )
+            return Metadata(path)
+
+        return pdf_metadata_from_exif(path, exif_data)
+
+
+def read_archive_members(
+        path: Path, path_filter: PathFilter | None = None, limits: ExtractionLimits | None = None
+) -> List[Tuple[Path, str, bytes | SpooledSource]]:
+    with zipfile.ZipFile(path, 'r') as zf:
+        return list(iter_archive_members(zf, path, path_filter, limits))
+
+
+def write_file(path: str, data: bytes):
+    with open(path, 'wb') as target:
+        target.write(data)
+
+
+# Async counterpart of generate_pages.iter_metadata, submissions are yielded in input order
+async def iter_metadata(
+        input_dir: Path,
+        zipped,
+        concurrency: int = 8,
+        exiftool_workers: int | None = None,
+        cache: MetadataCache | None = None,
+        path_filter: PathFilter | None = None,
+        limits: ExtractionLimits | None = None,
+        timeout: float | None = None,
+        executor: Executor | None = None,
+        subdirs: List[Path] | None = None,
+        dedup: bool = False
+) -> AsyncIterator[Tuple[Path, MetadataTable]]:
+    async with AsyncExifToolPool(exiftool_workers or os.cpu_count(), timeout=timeout) as exif_tool:
+        index = ContentIndex() if dedup else None
+        extractor = AsyncExtractor(exif_tool, concurrency, cache, path_filter, executor, limits, timeout, index)
+        if subdirs is None:
+            subdirs = await extractor.run(list_subdirs, input_dir)
+
+        pending: Deque[Tuple[Path, asyncio.Task]] = deque()
+        try:
+            for subdir in subdirs:
+                pending.append((subdir, asyncio.ensure_future(extractor.collect_submission(subdir, zipped))))
+                if len(pending) >= 2 * concurrency:
+                    subdir, task = pending.popleft()
+                    yield subdir, await task
+
+            while pending:
+                subdir, task = pending.popleft()
+                yield subdir, await task
+        finally:
+            # Submissions still in flight when the consumer stops are abandoned
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+
+def list_subdirs(input_dir: Path) -> List[Path]:
+    return list(input_dir.iterdir())
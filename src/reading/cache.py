@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict
+
+DEFAULT_CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'metadata-pages'
+
+
+# On-disk cache of extracted metadata, stored as lists of Metadata.to_dict() in SQLite.
+# Files are keyed by path, size and mtime, archive members by a hash of their content.
+# Entries written by another reader version are ignored, so bumping it invalidates the cache.
+# A cache that cannot be opened, e.g. under a read-only home, is turned off for the rest of the run.
+class MetadataCache(object):
+
+    def __init__(
+            self,
+            cache_dir: Path = DEFAULT_CACHE_DIR,
+            reader_version: int = 0,
+            refresh: bool = False,
+            max_age_days: float = 90,
+            max_size: int = 512 * 1024 * 1024
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.reader_version = reader_version
+        self.refresh = refresh
+        self.max_age_days = max_age_days
+        self.max_size = max_size
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        self.disabled = False
+
+    # The connection is not shared with forked worker processes, each one opens its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # None once the cache is disabled
+    @property
+    def connection(self) -> sqlite3.Connection | None:
+        if self.disabled:
+            return None
+        if self._connection is None or self._pid != os.getpid():
+            connection = None
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                connection = sqlite3.connect(
+                    self.cache_dir / 'metadata.sqlite3', timeout=30, isolation_level=None, check_same_thread=False
+                )
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS metadata ("
+                    "key TEXT PRIMARY KEY, reader_version INTEGER NOT NULL, value TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+                )
+                connection.execute("CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)")
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"Metadata cache in {self.cache_dir} cannot be opened, continuing without it: {e}")
+                if connection is not None:
+                    connection.close()
+                self.disabled = True
+                self._connection = None
+                return None
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    @staticmethod
+    def file_key(path: Path, kind: str = 'file') -> str:
+        stat = os.stat(path)
+        return f"{kind}:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    # Takes the hash of `data` if it is already known
+    @staticmethod
+    def content_key(filetype: str, data: bytes, content_hash: str | None = None) -> str:
+        return f"blob:{filetype}:{content_hash or hashlib.blake2b(data, digest_size=20).hexdigest()}"
+
+    def get(self, key: str) -> List[Dict] | None:
+        if self.refresh:
+            return None
+
+        with self._lock:
+            connection = self.connection
+            if connection is None:
+                return None
+            try:
+                row = connection.execute(
+                    "SELECT value, accessed FROM metadata WHERE key = ? AND reader_version = ?",
+                    (key, self.reader_version)
+                ).fetchone()
+                if row is None:
+                    return None
+
+                now = time.time()
+                # Access times only feed eviction, an hour of precision spares a write on most hits
+                if now - row[1] > 3600:
+                    connection.execute("UPDATE metadata SET accessed = ? WHERE key = ?", (now, key))
+                return json.loads(row[0])
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Metadata cache lookup failed for {key}: {e}")
+                return None
+
+    def put(self, key: str, value: List[Dict]):
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            connection = self.connection
+            if connection is None:
+                return
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO metadata (key, reader_version, value, size, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, self.reader_version, serialized, len(serialized), time.time())
+                )
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Metadata cache store failed for {key}: {e}")
+
+    def evict(self):
+        with self._lock:
+            connection = self.connection
+            if connection is None:
+                return
+            try:
+                connection.execute(
+                    "DELETE FROM metadata WHERE accessed < ? OR reader_version != ?",
+                    (time.time() - self.max_age_days * 24 * 3600, self.reader_version)
+                )
+                # Least recently used entries go first once the cache outgrows max_size
+                connection.execute(
+                    "DELETE FROM metadata WHERE key IN ("
+                    "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS total "
+                    "FROM metadata) WHERE total > ?)",
+                    (self.max_size,)
+                )
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Metadata cache eviction failed: {e}")
@@ -0,0 +1,29 @@
+import signal
+import threading
+from contextlib import contextmanager
+
+
+# Not an Exception, so that the broad handlers of the readers do not take it for a broken file
+class FileTimeoutError(BaseException):
+    pass
+
+
+# Interrupts the block with FileTimeoutError after `seconds`. Timers are only available to the main
+# thread of processes on Unix, blocks elsewhere run without a time budget: readers on other threads,
+# like the async executor and the server, only stop waiting for a read that is over its budget.
+@contextmanager
+def deadline(seconds: float | None, path=None):
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise FileTimeoutError(path)
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .extraction import MiB, SpooledSource
+from .metadata import Metadata
+
+HASH_CHUNK_SIZE = 1 * MiB
+HASH_DIGEST_SIZE = 20
+# Distinct contents whose metadata a ContentIndex keeps, the least recently used ones are dropped first
+INDEX_MAX_ENTRIES = 10_000
+
+
+def hash_content(source: bytes | SpooledSource) -> str:
+    return hashlib.blake2b(source, digest_size=HASH_DIGEST_SIZE).hexdigest()
+
+
+# Streamed in chunks, large files are never held in memory as a whole
+def hash_file(path: Path) -> str:
+    content_hash = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+# Hash of an in-memory `source`, or else of the file at `path`, None if the file cannot be read
+def hash_source(path: Path, source: bytes | SpooledSource | None = None) -> str | None:
+    if source is not None:
+        return hash_content(source)
+    try:
+        return hash_file(path)
+    except OSError as e:
+        logging.warning(f"Could not hash {path}: {e}")
+        return None
+
+
+# Metadata of the distinct contents recently read by this process, so copies of a file submitted under
+# other names or by other submitters are extracted once. Files that failed to read or came out empty are
+# not kept, their copies are read again. At most `max_entries` contents are kept.
+# The index is shared by the executor threads of the async engine, so it is guarded by a lock.
+class ContentIndex(object):
+
+    def __init__(self, max_entries: int = INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.metadatas: OrderedDict[str, Metadata] = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Copy of the metadata read for the same content, under the path of the duplicate
+    def get(self, content_hash: str | None, path) -> Metadata | None:
+        if not content_hash:
+            return None
+        with self._lock:
+            metadata = self.metadatas.get(content_hash)
+            if metadata is None:
+                return None
+            self.metadatas.move_to_end(content_hash)
+        return Metadata.from_dict(metadata.to_dict(), path)
+
+    def put(self, content_hash: str | None, metadata: Metadata | None):
+        if not content_hash or metadata is None or metadata.error is not None or metadata.is_empty():
+            return
+        with self._lock:
+            self.metadatas[content_hash] = metadata
+            self.metadatas.move_to_end(content_hash)
+            if len(self.metadatas) > self.max_entries:
+                self.metadatas.popitem(last=False)
@@ -0,0 +1,50 @@
+import xml.parsers.expat
+from typing import Dict, Iterable
+
+
+class _AllFound(Exception):
+    pass
+
+
+# Single streaming pass over a docProps part (core.xml, app.xml) collecting the text of the first
+# element for each of the qualified `tag_names`, parsing stops as soon as all of them were seen.
+# Like minidom's first child text node, an element without any text maps to None.
+# `data` is the whole part or its chunks, e.g. as read from the package within extraction limits.
+def read_docprops(data: bytes | Iterable[bytes], tag_names: Iterable[str]) -> Dict[str, str | None]:
+    wanted = set(tag_names)
+    found: Dict[str, str | None] = {}
+    current: str | None = None
+    text = []
+
+    def start_element(name, attributes):
+        nonlocal current
+        if current is None and name in wanted and name not in found:
+            current = name
+            text.clear()
+
+    def end_element(name):
+        nonlocal current
+        if name == current:
+            found[name] = ''.join(text) if text else None
+            current = None
+            if len(found) == len(wanted):
+                raise _AllFound()
+
+    def character_data(data):
+        if current is not None:
+            text.append(data)
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    chunks = [data] if isinstance(data, bytes) else data
+    try:
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+    except _AllFound:
+        pass
+
+    return found
@@ -0,0 +1,117 @@
+import mmap
+import tempfile
+import zipfile
+from contextlib import ExitStack
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple
+
+MiB = 1024 * 1024
+
+
+class ExtractionLimits(NamedTuple):
+    max_member_size: int = 256 * MiB  # Uncompressed bytes of a single member
+    max_archive_size: int = 1024 * MiB  # Uncompressed bytes of all members read from one archive
+    max_ratio: float = 200  # Uncompressed to compressed size, only checked past ratio_min_size
+    ratio_min_size: int = 1 * MiB
+    spool_size: int = 16 * MiB  # Larger members are spooled to a temporary file instead of memory
+    chunk_size: int = 1 * MiB
+
+
+class ExtractionLimitError(Exception):
+    pass
+
+
+# Raised once the members read so far exceed max_archive_size, no further member should be read
+class ArchiveLimitError(ExtractionLimitError):
+    pass
+
+
+# Read-only map of a member spooled to disk, readers use it like bytes or like a seekable file
+class SpooledSource(mmap.mmap):
+
+    def seekable(self) -> bool:
+        return True
+
+
+# Archive members are extracted chunk by chunk and given up on as soon as they break a limit, no matter
+# what sizes the archive declares. Small members come back as bytes, larger ones as a SpooledSource
+# of an anonymous temporary file, which `close_source` releases.
+class ArchiveExtractor(object):
+
+    def __init__(self, zf: zipfile.ZipFile, limits: ExtractionLimits | None = None):
+        self.zf = zf
+        self.limits = limits or ExtractionLimits()
+        self.extracted = 0
+
+    def max_ratio_size(self, member: zipfile.ZipInfo) -> float:
+        return max(self.limits.ratio_min_size, self.limits.max_ratio * member.compress_size)
+
+    # Declared sizes are checked up front only to give up early, the actual sizes are checked while reading
+    def check_declared(self, member: zipfile.ZipInfo):
+        limits = self.limits
+        if member.file_size > self.max_ratio_size(member):
+            raise ExtractionLimitError(f"Member declares a compression ratio over {limits.max_ratio}")
+        if member.file_size > limits.max_member_size:
+            raise ExtractionLimitError(f"Member declares {member.file_size} bytes, over {limits.max_member_size}")
+        if self.extracted + member.file_size > limits.max_archive_size:
+            raise ArchiveLimitError(f"Archive exceeds {limits.max_archive_size} uncompressed bytes")
+
+    def extract(self, member: zipfile.ZipInfo) -> bytes | SpooledSource:
+        self.check_declared(member)
+        with self.zf.open(member) as member_file:
+            return spool(self.iter_chunks(member, member_file), self.limits.spool_size)
+
+    # Chunks of the member for readers that parse it as a stream, nothing of it is held at once
+    def iter_member(self, member: zipfile.ZipInfo | str) -> Iterator[bytes]:
+        if isinstance(member, str):
+            member = self.zf.getinfo(member)
+        self.check_declared(member)
+        with self.zf.open(member) as member_file:
+            yield from self.iter_chunks(member, member_file)
+
+    def iter_chunks(self, member: zipfile.ZipInfo, member_file: BinaryIO) -> Iterator[bytes]:
+        limits = self.limits
+        max_ratio_size = self.max_ratio_size(member)
+        size = 0
+        while chunk := member_file.read(limits.chunk_size):
+            size += len(chunk)
+            self.extracted += len(chunk)
+            if size > limits.max_member_size:
+                raise ExtractionLimitError(f"Member exceeds {limits.max_member_size} bytes")
+            if self.extracted > limits.max_archive_size:
+                raise ArchiveLimitError(f"Archive exceeds {limits.max_archive_size} uncompressed bytes")
+            if size > max_ratio_size:
+                raise ExtractionLimitError(f"Member exceeds a compression ratio of {limits.max_ratio}")
+            yield chunk
+
+
+# Joins the chunks in memory, or spools them to an anonymous temporary file once past `spool_size` bytes
+def spool(chunks: Iterable[bytes], spool_size: int) -> bytes | SpooledSource:
+    parts: List[bytes] = []
+    size = 0
+    with ExitStack() as stack:
+        spool_file = None
+        for chunk in chunks:
+            size += len(chunk)
+            if spool_file is None and size > spool_size:
+                spool_file = stack.enter_context(tempfile.TemporaryFile())
+                spool_file.writelines(parts)
+                parts.clear()
+            if spool_file is None:
+                parts.append(chunk)
+            else:
+                spool_file.write(chunk)
+
+        if spool_file is None:
+            return b''.join(parts)
+        spool_file.flush()
+        # The map outlives the file it was made from
+        return SpooledSource(spool_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def close_source(source: bytes | SpooledSource | None):
+    if isinstance(source, SpooledSource):
+        try:
+            source.close()
+        except BufferError:
+            # Still read by an abandoned reader, the map goes once that lets go of it
+            pass
@@ -0,0 +1,213 @@
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Dict, Iterable, Iterator, Tuple
+
+# Marks a missing value in the integer columns of MetadataTable
+MISSING = -2 ** 63
+# Marks a timestamp without timezone in the offset columns of MetadataTable
+NAIVE = -2 ** 31
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class Metadata:
+    __slots__ = (
+        'path', 'pages', 'template', 'total_time', 'creator', 'last_modified_by',
+        'date_created', 'date_modified', 'last_printed', 'error', 'content_hash'
+    )
+
+    def __init__(self, path):
+        self.path = path
+
+        self.pages: int | None = None
+        self.template: str | None = None
+
+        self.total_time: int | None = None  # In minutes
+
+        self.creator: str | None = None
+        self.last_modified_by: str | None = None
+
+        self.date_created: datetime | None = None
+        self.date_modified: datetime | None = None
+        self.last_printed: datetime | None = None
+
+        # Why the file could not be read, e.g. it ran out of time
+        self.error: str | None = None
+        # Hash of the file content, files with the same one are copies of each other
+        self.content_hash: str | None = None
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.path)[1][1:]
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in (
+            self.pages, self.template, self.total_time, self.creator, self.last_modified_by,
+            self.date_created, self.date_modified, self.last_printed
+        ))
+
+    def to_dict(self) -> Dict:
+        return {
+            'path': str(self.path),
+            'pages': self.pages,
+            'template': self.template,
+            'total_time': self.total_time,
+            'creator': self.creator,
+            'last_modified_by': self.last_modified_by,
+            'date_created': self.date_created.isoformat() if self.date_created else None,
+            'date_modified': self.date_modified.isoformat() if self.date_modified else None,
+            'last_printed': self.last_printed.isoformat() if self.last_printed else None,
+            'error': self.error,
+            'content_hash': self.content_hash,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, path=None) -> 'Metadata':
+        metadata = cls(path if path is not None else Path(data['path']))
+        metadata.pages = data.get('pages')
+        metadata.template = data.get('template')
+        metadata.total_time = data.get('total_time')
+        metadata.creator = data.get('creator')
+        metadata.last_modified_by = data.get('last_modified_by')
+        metadata.date_created = nullable_isoformat_to_datetime(data.get('date_created'))
+        metadata.date_modified = nullable_isoformat_to_datetime(data.get('date_modified'))
+        metadata.last_printed = nullable_isoformat_to_datetime(data.get('last_printed'))
+        metadata.error = data.get('error')
+        metadata.content_hash = data.get('content_hash')
+        return metadata
+
+
+def nullable_isoformat_to_datetime(date: str | None) -> datetime | None:
+    if date:
+        return datetime.fromisoformat(date)
+    return None
+
+
+# Each distinct string is stored once, rows refer to it by index, -1 stands for None
+class StringPool(object):
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self.indices: Dict[str, int] = {}
+
+    # Only the strings are pickled, the index is rebuilt on the receiving side
+    def __getstate__(self):
+        return self.strings
+
+    def __setstate__(self, strings):
+        self.strings = strings
+        self.indices = {string: i for i, string in enumerate(strings)}
+
+    def add(self, string: str | None) -> int:
+        if string is None:
+            return -1
+        index = self.indices.get(string)
+        if index is None:
+            index = self.indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def get(self, index: int) -> str | None:
+        return self.strings[index] if index >= 0 else None
+
+
+# Columnar store of Metadata for large corpora and cheap pickling between worker processes.
+# Numbers live in typed arrays, timestamps as epoch microseconds of the wall time plus the UTC offset
+# in seconds, and strings in a shared pool. Rows are materialized as Metadata again when read.
+class MetadataTable(object):
+
+    def __init__(self, metadatas: Iterable[Metadata] = ()):
+        self.strings = StringPool()
+        self.directories = StringPool()
+        self.directories_of = array('i')
+        self.names: List[str] = []
+        self.pages = array('q')
+        self.total_time = array('q')
+        self.template = array('i')
+        self.creator = array('i')
+        self.last_modified_by = array('i')
+        self.error = array('i')
+        self.content_hash = array('i')
+        self.dates = array('q')  # date_created, date_modified, last_printed per row
+        self.offsets = array('i')
+        # Why the submission could not be extracted at all, its table is empty then
+        self.failure: str | None = None
+        self.extend(metadatas)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[Metadata]:
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i: int) -> Metadata:
+        if i < 0:
+            i += len(self)
+        metadata = Metadata(Path(self.directories.get(self.directories_of[i]), self.names[i]))
+        metadata.pages = column_to_int(self.pages[i])
+        metadata.total_time = column_to_int(self.total_time[i])
+        metadata.template = self.strings.get(self.template[i])
+        metadata.creator = self.strings.get(self.creator[i])
+        metadata.last_modified_by = self.strings.get(self.last_modified_by[i])
+        metadata.error = self.strings.get(self.error[i])
+        metadata.content_hash = self.strings.get(self.content_hash[i])
+        metadata.date_created = column_to_datetime(self.dates[3 * i], self.offsets[3 * i])
+        metadata.date_modified = column_to_datetime(self.dates[3 * i + 1], self.offsets[3 * i + 1])
+        metadata.last_printed = column_to_datetime(self.dates[3 * i + 2], self.offsets[3 * i + 2])
+        return metadata
+
+    def append(self, metadata: Metadata):
+        directory, name = os.path.split(metadata.path)
+        self.directories_of.append(self.directories.add(directory))
+        self.names.append(name)
+        self.pages.append(int_to_column(metadata.pages))
+        self.total_time.append(int_to_column(metadata.total_time))
+        self.template.append(self.strings.add(metadata.template))
+        self.creator.append(self.strings.add(metadata.creator))
+        self.last_modified_by.append(self.strings.add(metadata.last_modified_by))
+        self.error.append(self.strings.add(metadata.error))
+        self.content_hash.append(self.strings.add(metadata.content_hash))
+        for value in (metadata.date_created, metadata.date_modified, metadata.last_printed):
+            micros, offset = datetime_to_column(value)
+            self.dates.append(micros)
+            self.offsets.append(offset)
+
+    def extend(self, metadatas: Iterable[Metadata]):
+        for metadata in metadatas:
+            self.append(metadata)
+
+
+# Values outside the int64 range of the columns, e.g. a forged page count, are stored as missing
+def int_to_column(value: int | None) -> int:
+    if value is None:
+        return MISSING
+    value = int(value)
+    return value if MISSING < value < -MISSING else MISSING
+
+
+def column_to_int(value: int) -> int | None:
+    return None if value == MISSING else value
+
+
+def datetime_to_column(value: datetime | None) -> Tuple[int, int]:
+    if value is None:
+        return MISSING, NAIVE
+    offset = value.utcoffset()
+    micros = (value.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+    return micros, NAIVE if offset is None else int(offset.total_seconds())
+
+
+def column_to_datetime(micros: int, offset: int) -> datetime | None:
+    if micros == MISSING:
+        return None
+    value = _EPOCH + timedelta(microseconds=micros)
+    if offset != NAIVE:
+        value = value.replace(tzinfo=timezone(timedelta(seconds=offset)))
+    return value
@@ -0,0 +1,256 @@
+import mmap
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple, List, Dict, Tuple
+
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+MAXREGSECT = 0xFFFFFFFA
+ENDOFCHAIN = 0xFFFFFFFE
+NOSTREAM = 0xFFFFFFFF
+
+DIRECTORY_ENTRY_SIZE = 128
+MINI_SECTOR_SIZE = 64
+
+VT_I2 = 2
+VT_I4 = 3
+VT_BSTR = 8
+VT_LPSTR = 30
+VT_FILETIME = 64
+
+SUMMARY_INFORMATION = '\x05SummaryInformation'
+# Only these SummaryInformation properties are decoded, named like the attributes of olefile's OleMetadata
+SUMMARY_PROPERTIES = {
+    4: 'author',
+    7: 'template',
+    8: 'last_saved_by',
+    10: 'total_edit_time',
+    11: 'last_printed',
+    12: 'create_time',
+    13: 'last_saved_time',
+    14: 'num_pages',
+}
+EDIT_TIME_PROPERTY = 10
+
+FILETIME_NULL_DATE = datetime(1601, 1, 1)
+
+
+class OleError(Exception):
+    pass
+
+
+class NotOleFileError(OleError):
+    pass
+
+
+# Values as olefile's OleMetadata reports them: strings are raw bytes, the edit time is in seconds
+class OleSummary(NamedTuple):
+    author: bytes | None = None
+    template: bytes | None = None
+    last_saved_by: bytes | None = None
+    total_edit_time: int | None = None
+    last_printed: datetime | None = None
+    create_time: datetime | None = None
+    last_saved_time: datetime | None = None
+    num_pages: int | None = None
+
+
+# Sector chain of a compound file, only followed through the FAT as far as it is indexed
+class SectorChain(object):
+
+    def __init__(self, compound_file: 'CompoundFile', start: int):
+        self.compound_file = compound_file
+        self.sectors: List[int] = []
+        self.next = start
+
+    def __getitem__(self, index: int) -> int:
+        while len(self.sectors) <= index:
+            if self.next == ENDOFCHAIN:
+                raise OleError("Sector chain ends early")
+            if len(self.sectors) > self.compound_file.sector_count:
+                raise OleError("Sector chain contains a loop")
+            self.sectors.append(self.next)
+            self.next = self.compound_file.fat_entry(self.next)
+        return self.sectors[index]
+
+
+# Read-only view of an OLE compound file that only loads the FAT and DIFAT sectors it needs to.
+# Anything outside of the specification raises OleError, callers fall back to olefile then.
+class CompoundFile(object):
+
+    def __init__(self, data):
+        if len(data) < 512 or data[:8] != OLE_SIGNATURE:
+            raise NotOleFileError("Missing OLE signature")
+
+        byte_order, sector_shift, mini_sector_shift = struct.unpack_from('<HHH', data, 0x1C)
+        if byte_order != 0xFFFE or sector_shift not in (9, 12) or mini_sector_shift != 6:
+            raise OleError("Unsupported OLE header")
+
+        (
+            fat_sector_count, first_directory_sector, _, self.mini_stream_cutoff,
+            first_minifat_sector, _, self.next_difat_sector, _
+        ) = struct.unpack_from('<8I', data, 0x2C)
+
+        self.data = data
+        self.sector_size = 1 << sector_shift
+        self.sector_count = (len(data) + self.sector_size - 1) // self.sector_size - 1
+        self.entries_per_sector = self.sector_size // 4
+        self.difat: List[int] = list(struct.unpack_from('<109I', data, 0x4C))[:fat_sector_count]
+        self.fat_sector_count = fat_sector_count
+        self.fat_sectors: Dict[int, Tuple[int, ...]] = {}
+        self.directory = SectorChain(self, first_directory_sector)
+        self.minifat = SectorChain(self, first_minifat_sector)
+        self.mini_stream: SectorChain | None = None
+
+    def sector_offset(self, sector: int) -> int:
+        if sector > MAXREGSECT or sector >= self.sector_count:
+            raise OleError(f"Sector {sector} is out of range")
+        return (sector + 1) * self.sector_size
+
+    def fat_entry(self, sector: int) -> int:
+        index, position = divmod(sector, self.entries_per_sector)
+        entries = self.fat_sectors.get(index)
+        if entries is None:
+            entries = struct.unpack_from(
+                f'<{self.entries_per_sector}I', self.data, self.sector_offset(self.difat_entry(index))
+            )
+            self.fat_sectors[index] = entries
+        return entries[position]
+
+    def difat_entry(self, index: int) -> int:
+        if index >= self.fat_sector_count:
+            raise OleError(f"FAT sector {index} is out of range")
+        # DIFAT sectors past the header are only read for files over about 7 MB
+        while index >= len(self.difat):
+            if self.next_difat_sector > MAXREGSECT or len(self.difat) > self.sector_count:
+                raise OleError("DIFAT ends early")
+            entries = struct.unpack_from(
+                f'<{self.entries_per_sector}I', self.data, self.sector_offset(self.next_difat_sector)
+            )
+            self.difat.extend(entries[:-1])
+            self.next_difat_sector = entries[-1]
+        return self.difat[index]
+
+    def directory_entry(self, sid: int) -> Tuple[str, int, int, int, int, int, int]:
+        sector, position = divmod(sid * DIRECTORY_ENTRY_SIZE, self.sector_size)
+        offset = self.sector_offset(self.directory[sector]) + position
+        name_length, entry_type = struct.unpack_from('<HB', self.data, offset + 64)
+        left, right, child = struct.unpack_from('<III', self.data, offset + 68)
+        start, size_low, size_high = struct.unpack_from('<III', self.data, offset + 116)
+        if name_length > 64 or name_length % 2:
+            raise OleError(f"Invalid name of directory entry {sid}")
+        name = bytes(self.data[offset:offset + max(name_length - 2, 0)]).decode('utf-16-le')
+        # Version 3 files may leave garbage in the high half of the size
+        size = size_low | (size_high << 32) if self.sector_size == 4096 else size_low
+        return name, entry_type, left, right, child, start, size
+
+    # Streams directly below the root storage, their siblings form a tree of left and right links
+    def find_stream(self, name: str) -> Tuple[int, int] | None:
+        _, root_type, _, _, child, _, _ = self.directory_entry(0)
+        if root_type != 5:
+            raise OleError("First directory entry is not the root")
+
+        pending = [child]
+        visited = set()
+        while pending:
+            sid = pending.pop()
+            if sid == NOSTREAM:
+                continue
+            if sid in visited:
+                raise OleError("Directory tree contains a loop")
+            visited.add(sid)
+
+            entry_name, entry_type, left, right, _, start, size = self.directory_entry(sid)
+            if entry_type == 2 and entry_name.lower() == name.lower():
+                return start, size
+            pending.extend((left, right))
+        return None
+
+    def read_stream(self, start: int, size: int) -> bytes:
+        if size > len(self.data):
+            raise OleError("Stream is larger than the file")
+
+        chunks = []
+        remaining = size
+        if size < self.mini_stream_cutoff:
+            # Small streams are stored in mini sectors inside the stream of the root entry
+            if self.mini_stream is None:
+                self.mini_stream = SectorChain(self, self.directory_entry(0)[5])
+            sector = start
+            for _ in range((size + MINI_SECTOR_SIZE - 1) // MINI_SECTOR_SIZE):
+                if sector > MAXREGSECT:
+                    raise OleError("Mini sector chain ends early")
+                regular, position = divmod(sector * MINI_SECTOR_SIZE, self.sector_size)
+                offset = self.sector_offset(self.mini_stream[regular]) + position
+                chunks.append(self.data[offset:offset + min(MINI_SECTOR_SIZE, remaining)])
+                remaining -= MINI_SECTOR_SIZE
+                sector = self.minifat_entry(sector)
+        else:
+            chain = SectorChain(self, start)
+            for index in range((size + self.sector_size - 1) // self.sector_size):
+                offset = self.sector_offset(chain[index])
+                chunks.append(self.data[offset:offset + min(self.sector_size, remaining)])
+                remaining -= self.sector_size
+
+        stream = b''.join(chunks)
+        if len(stream) != size:
+            raise OleError("Stream is truncated")
+        return stream
+
+    def minifat_entry(self, sector: int) -> int:
+        index, position = divmod(sector, self.entries_per_sector)
+        return struct.unpack_from('<I', self.data, self.sector_offset(self.minifat[index]) + 4 * position)[0]
+
+
+def parse_summary_information(stream: bytes) -> OleSummary:
+    byte_order, = struct.unpack_from('<H', stream, 0)
+    if byte_order != 0xFFFE:
+        raise OleError("Invalid property set byte order")
+
+    section_offset, = struct.unpack_from('<I', stream, 44)
+    section_size, property_count = struct.unpack_from('<II', stream, section_offset)
+    section = stream[section_offset:section_offset + section_size]
+    property_count = min(property_count, len(section) // 8)
+
+    values = {}
+    for i in range(property_count):
+        property_id, offset = struct.unpack_from('<II', section, 8 + 8 * i)
+        name = SUMMARY_PROPERTIES.get(property_id)
+        if name is not None:
+            values[name] = parse_property(section, offset, property_id)
+    return OleSummary(**values)
+
+
+def parse_property(section: bytes, offset: int, property_id: int):
+    property_type, = struct.unpack_from('<I', section, offset)
+    offset += 4
+    if property_type == VT_I2:
+        return struct.unpack_from('<h', section, offset)[0]
+    elif property_type == VT_I4:
+        # Read unsigned, as olefile does
+        return struct.unpack_from('<I', section, offset)[0]
+    elif property_type in (VT_LPSTR, VT_BSTR):
+        count, = struct.unpack_from('<I', section, offset)
+        return section[offset + 4:offset + 4 + count - 1].replace(b'\x00', b'')
+    elif property_type == VT_FILETIME:
+        filetime, = struct.unpack_from('<Q', section, offset)
+        # The edit time is a duration, not a timestamp
+        if property_id == EDIT_TIME_PROPERTY:
+            return filetime // 10000000
+        return FILETIME_NULL_DATE + timedelta(microseconds=filetime // 10)
+    raise OleError(f"Unsupported type {property_type} of property {property_id}")
+
+
+def parse_ole_summary(data) -> OleSummary:
+    compound_file = CompoundFile(data)
+    stream = compound_file.find_stream(SUMMARY_INFORMATION)
+    if stream is None:
+        return OleSummary()
+    return parse_summary_information(compound_file.read_stream(*stream))
+
+
+def read_ole_summary(path: Path) -> OleSummary:
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_ole_summary(data)
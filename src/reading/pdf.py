@@ -0,0 +1,526 @@
+import mmap
+import re
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Reads the handful of PDF Info fields the report needs straight from the file: only the
+# trailer, the cross-reference sections and the objects they point to are ever parsed.
+
+_WS = rb'\x00\t\n\x0c\r '
+_DELIMITERS = rb'()<>\[\]{}/%'
+_REGULAR = rb'[^' + _WS + _DELIMITERS + rb']'
+
+WHITESPACE_REGEX = re.compile(rb'(?:[' + _WS + rb']+|%[^\r\n]*)*')
+REF_REGEX = re.compile(rb'(\d+)[' + _WS + rb']+(\d+)[' + _WS + rb']+R(?!' + _REGULAR + rb')')
+NUMBER_REGEX = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+NAME_REGEX = re.compile(rb'/(' + _REGULAR + rb'*)')
+KEYWORD_REGEX = re.compile(_REGULAR + rb'+')
+OBJ_REGEX = re.compile(rb'(\d+)[' + _WS + rb']+(\d+)[' + _WS + rb']+obj(?!' + _REGULAR + rb')')
+OBJ_SCAN_REGEX = re.compile(rb'(?<![0-9])' + OBJ_REGEX.pattern)
+LITERAL_SPECIAL_REGEX = re.compile(rb'[()\\]')
+OCTAL_REGEX = re.compile(rb'[0-7]{1,3}')
+NAME_ESCAPE_REGEX = re.compile(rb'#([0-9A-Fa-f]{2})')
+XREF_SUBSECTION_REGEX = re.compile(rb'(\d+)[ \t]+(\d+)[ \t]*[\r\n]')
+XREF_ENTRY_REGEX = re.compile(rb'(\d{10})[ ](\d{5})[ ]([nf])')
+DATE_REGEX = re.compile(
+    r"(?:D:)?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?\s*(?:([Zz+\-])(\d{2})?'?(\d{2})?'?)?"
+)
+
+LITERAL_ESCAPES = {
+    ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b', ord('f'): b'\f',
+    ord('('): b'(', ord(')'): b')', ord('\\'): b'\\',
+}
+
+# Code points where PDFDocEncoding differs from latin-1
+PDF_DOC_ENCODING = {
+    0x18: '˘', 0x19: 'ˇ', 0x1a: 'ˆ', 0x1b: '˙',
+    0x1c: '˝', 0x1d: '˛', 0x1e: '˚', 0x1f: '˜',
+    0x80: '•', 0x81: '†', 0x82: '‡', 0x83: '…',
+    0x84: '—', 0x85: '–', 0x86: 'ƒ', 0x87: '⁄',
+    0x88: '‹', 0x89: '›', 0x8a: '−', 0x8b: '‰',
+    0x8c: '„', 0x8d: '“', 0x8e: '”', 0x8f: '‘',
+    0x90: '’', 0x91: '‚', 0x92: '™', 0x93: 'ﬁ',
+    0x94: 'ﬂ', 0x95: 'Ł', 0x96: 'Œ', 0x97: 'Š',
+    0x98: 'Ÿ', 0x99: 'Ž', 0x9a: 'ı', 0x9b: 'ł',
+    0x9c: 'œ', 0x9d: 'š', 0x9e: 'ž', 0xa0: '€',
+}
+PDF_DOC_DECODING_TABLE = str.maketrans({chr(code): char for code, char in PDF_DOC_ENCODING.items()})
+
+MAX_NESTING = 64
+MAX_DECODED_STREAM = 64 * 1024 * 1024
+
+Ref = namedtuple('Ref', ['num', 'gen'])
+
+
+class PdfError(Exception):
+    pass
+
+
+class PdfEncryptedError(PdfError):
+    pass
+
+
+class Name(str):
+    pass
+
+
+class Stream:
+
+    def __init__(self, dictionary: Dict, start: int):
+        self.dict = dictionary
+        self.start = start
+
+
+class PdfInfo:
+
+    def __init__(self):
+        self.page_count: int | None = None
+        self.creator: str | None = None
+        self.create_date: datetime | None = None
+        self.modify_date: datetime | None = None
+
+
+class PdfParser:
+
+    def __init__(self, data):
+        self.data = data
+
+    def skip_whitespace(self, pos: int) -> int:
+        return WHITESPACE_REGEX.match(self.data, pos).end()
+
+    def parse_object(self, pos: int, depth: int = 0):
+        if depth > MAX_NESTING:
+            raise PdfError(f"Objects nested too deep at {pos}")
+
+        data = self.data
+        pos = self.skip_whitespace(pos)
+        head = data[pos:pos + 2]
+        if head == b'<<':
+            return self.parse_dictionary(pos + 2, depth)
+        if head[:1] == b'<':
+            end = data.find(b'>', pos)
+            if end == -1:
+                raise PdfError(f"Unterminated hex string at {pos}")
+            digits = re.sub(rb'[^0-9A-Fa-f]', b'', data[pos + 1:end])
+            if len(digits) % 2:
+                digits += b'0'
+            return bytes.fromhex(digits.decode()), end + 1
+        if head[:1] == b'[':
+            return self.parse_array(pos + 1, depth)
+        if head[:1] == b'(':
+            return self.parse_literal_string(pos + 1)
+        if head[:1] == b'/':
+            match = NAME_REGEX.match(data, pos)
+            name = NAME_ESCAPE_REGEX.sub(lambda m: bytes.fromhex(m.group(1).decode()), match.group(1))
+            return Name(name.decode('latin-1')), match.end()
+
+        match = REF_REGEX.match(data, pos)
+        if match:
+            return Ref(int(match.group(1)), int(match.group(2))), match.end()
+        match = NUMBER_REGEX.match(data, pos)
+        if match:
+            number = match.group()
+            return (float(number) if b'.' in number else int(number)), match.end()
+        match = KEYWORD_REGEX.match(data, pos)
+        if match:
+            keyword = match.group()
+            if keyword in (b'true', b'false'):
+                return keyword == b'true', match.end()
+            if keyword == b'null':
+                return None, match.end()
+        raise PdfError(f"Unexpected token at {pos}: {data[pos:pos + 16]!r}")
+
+    def parse_dictionary(self, pos: int, depth: int) -> Tuple[Dict, int]:
+        dictionary = {}
+        while True:
+            pos = self.skip_whitespace(pos)
+            if self.data[pos:pos + 2] == b'>>':
+                return dictionary, pos + 2
+            key, pos = self.parse_object(pos, depth + 1)
+            if not isinstance(key, Name):
+                raise PdfError(f"Dictionary key is not a name at {pos}")
+            dictionary[key], pos = self.parse_object(pos, depth + 1)
+
+    def parse_array(self, pos: int, depth: int) -> Tuple[List, int]:
+        array = []
+        while True:
+            pos = self.skip_whitespace(pos)
+            if self.data[pos:pos + 1] == b']':
+                return array, pos + 1
+            if pos >= len(self.data):
+                raise PdfError("Unterminated array")
+            value, pos = self.parse_object(pos, depth + 1)
+            array.append(value)
+
+    def parse_literal_string(self, pos: int) -> Tuple[bytes, int]:
+        data = self.data
+        output = bytearray()
+        depth = 1
+        while True:
+            match = LITERAL_SPECIAL_REGEX.search(data, pos)
+            if not match:
+                raise PdfError("Unterminated literal string")
+            output += data[pos:match.start()]
+            char = data[match.start()]
+            pos = match.end()
+
+            if char == ord('\\'):
+                escaped = data[pos] if pos < len(data) else None
+                if escaped in LITERAL_ESCAPES:
+                    output += LITERAL_ESCAPES[escaped]
+                    pos += 1
+                elif escaped in (ord('\r'), ord('\n')):
+                    pos += 2 if data[pos:pos + 2] == b'\r\n' else 1
+                elif escaped is not None and ord('0') <= escaped <= ord('7'):
+                    octal = OCTAL_REGEX.match(data, pos)
+                    output.append(int(octal.group(), 8) & 0xFF)
+                    pos = octal.end()
+                elif escaped is not None:
+                    output.append(escaped)
+                    pos += 1
+            elif char == ord('('):
+                depth += 1
+                output.append(char)
+            else:
+                depth -= 1
+                if depth == 0:
+                    return bytes(output), pos
+                output.append(char)
+
+    def parse_indirect(self, pos: int) -> Tuple[int, object]:
+        match = OBJ_REGEX.match(self.data, self.skip_whitespace(pos))
+        if not match:
+            raise PdfError(f"No object at offset {pos}")
+
+        value, pos = self.parse_object(match.end())
+        pos = self.skip_whitespace(pos)
+        if isinstance(value, dict) and self.data[pos:pos + 6] == b'stream':
+            pos += 6
+            if self.data[pos:pos + 2] == b'\r\n':
+                pos += 2
+            elif self.data[pos:pos + 1] in (b'\n', b'\r'):
+                pos += 1
+            value = Stream(value, pos)
+        return int(match.group(1)), value
+
+
+class PdfDocument:
+
+    def __init__(self, data):
+        self.data = data
+        self.parser = PdfParser(data)
+        # Object number -> ('offset', byte offset) or ('compressed', object stream number, index)
+        self.xref: Dict[int, Tuple] = {}
+        self.trailer: Dict = {}
+        self._objects: Dict[int, object] = {}
+        self._object_streams: Dict[int, Tuple[PdfParser, List[Tuple[int, int]]]] = {}
+
+    def load_xref(self):
+        startxref = self.data.rfind(b'startxref', max(0, len(self.data) - 4096))
+        if startxref == -1:
+            raise PdfError("Missing startxref")
+
+        offset = int(NUMBER_REGEX.match(self.data, self.parser.skip_whitespace(startxref + 9)).group())
+        visited = set()
+        # Newest section comes first, older incremental updates never override what it defines
+        while isinstance(offset, int) and offset not in visited:
+            visited.add(offset)
+            trailer = self.load_xref_section(offset)
+            if isinstance(trailer.get('XRefStm'), int):
+                self.load_xref_section(trailer['XRefStm'])
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            offset = trailer.get('Prev')
+
+    def load_xref_section(self, offset: int) -> Dict:
+        pos = self.parser.skip_whitespace(offset)
+        if self.data[pos:pos + 4] == b'xref':
+            return self.load_xref_table(pos + 4)
+
+        _, stream = self.parser.parse_indirect(pos)
+        if not isinstance(stream, Stream) or stream.dict.get('Type') != 'XRef':
+            raise PdfError(f"No cross-reference section at offset {offset}")
+        self.load_xref_stream(stream)
+        return stream.dict
+
+    def load_xref_table(self, pos: int) -> Dict:
+        data = self.data
+        while True:
+            pos = self.parser.skip_whitespace(pos)
+            subsection = XREF_SUBSECTION_REGEX.match(data, pos)
+            if not subsection:
+                break
+            start, count = int(subsection.group(1)), int(subsection.group(2))
+            pos = subsection.end()
+            for num in range(start, start + count):
+                entry = XREF_ENTRY_REGEX.match(data, self.parser.skip_whitespace(pos))
+                if not entry:
+                    raise PdfError(f"Malformed cross-reference entry at {pos}")
+                pos = entry.end()
+                if entry.group(3) == b'n' and int(entry.group(1)) > 0:
+                    self.xref.setdefault(num, ('offset', int(entry.group(1))))
+
+        if data[pos:pos + 7] != b'trailer':
+            raise PdfError(f"Missing trailer at {pos}")
+        trailer, _ = self.parser.parse_object(pos + 7)
+        return trailer
+
+    def load_xref_stream(self, stream: Stream):
+        widths = stream.dict.get('W')
+        if not isinstance(widths, list) or len(widths) != 3:
+            raise PdfError("Cross-reference stream without /W")
+        index = stream.dict.get('Index') or [0, stream.dict.get('Size', 0)]
+
+        data = self.decode_stream(stream)
+        entry_size = sum(widths)
+        pos = 0
+        for start, count in zip(index[::2], index[1::2]):
+            for num in range(start, start + count):
+                if pos + entry_size > len(data):
+                    return
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos:pos + width], 'big'))
+                    pos += width
+                entry_type = fields[0] if widths[0] else 1
+                if entry_type == 1:
+                    self.xref.setdefault(num, ('offset', fields[1]))
+                elif entry_type == 2:
+                    self.xref.setdefault(num, ('compressed', fields[1], fields[2]))
+
+    def reconstruct_xref(self):
+        # Used when the cross-reference data is damaged: every "N G obj" in the file is indexed
+        # and the later definition of an object wins, just like with incremental updates
+        self.xref = {}
+        self.trailer = {}
+        self._objects.clear()
+        self._object_streams.clear()
+        for match in OBJ_SCAN_REGEX.finditer(self.data):
+            self.xref[int(match.group(1))] = ('offset', match.start())
+
+        for num, (_, offset) in list(self.xref.items()):
+            try:
+                _, value = self.parser.parse_indirect(offset)
+            except Exception:
+                continue
+            if isinstance(value, Stream) and value.dict.get('Type') == 'XRef':
+                self.trailer.update(value.dict)
+            elif isinstance(value, Stream) and value.dict.get('Type') == 'ObjStm':
+                try:
+                    _, header = self.get_object_stream(num)
+                except Exception:
+                    continue
+                for index, (member, _) in enumerate(header):
+                    self.xref.setdefault(member, ('compressed', num, index))
+
+        for match in re.finditer(rb'trailer', self.data):
+            try:
+                trailer, _ = self.parser.parse_object(match.end())
+            except Exception:
+                continue
+            if isinstance(trailer, dict):
+                self.trailer.update(trailer)
+
+    def stream_data(self, stream: Stream) -> bytes:
+        length = stream.dict.get('Length')
+        if isinstance(length, Ref):
+            length = self.resolve(length)
+        if isinstance(length, int) and length >= 0:
+            end = stream.start + length
+            pos = self.parser.skip_whitespace(end)
+            if self.data[pos:pos + 9] == b'endstream':
+                return self.data[stream.start:end]
+
+        end = self.data.find(b'endstream', stream.start)
+        if end == -1:
+            raise PdfError("Unterminated stream")
+        return self.data[stream.start:end].rstrip(b'\r\n')
+
+    def decode_stream(self, stream: Stream) -> bytes:
+        data = self.stream_data(stream)
+        filters = stream.dict.get('Filter') or []
+        params = stream.dict.get('DecodeParms') or []
+        if not isinstance(filters, list):
+            filters = [filters]
+        if not isinstance(params, list):
+            params = [params]
+
+        for i, name in enumerate(filters):
+            if name not in ('FlateDecode', 'Fl'):
+                raise PdfError(f"Unsupported stream filter {name}")
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(data, MAX_DECODED_STREAM)
+            if decompressor.unconsumed_tail:
+                raise PdfError("Decoded stream is too large")
+            param = params[i] if i < len(params) and isinstance(params[i], dict) else {}
+            data = apply_predictor(data, param)
+        return data
+
+    def get_object_stream(self, num: int) -> Tuple[PdfParser, List[Tuple[int, int]]]:
+        if num not in self._object_streams:
+            stream = self.get_object(num)
+            if not isinstance(stream, Stream):
+                raise PdfError(f"Object {num} is not an object stream")
+            data = self.decode_stream(stream)
+            first = stream.dict.get('First', 0)
+            numbers = [int(number) for number in re.findall(rb'\d+', data[:first])]
+            header = list(zip(numbers[::2], (first + offset for offset in numbers[1::2])))
+            self._object_streams[num] = (PdfParser(data), header)
+        return self._object_streams[num]
+
+    def get_object(self, num: int):
+        if num in self._objects:
+            return self._objects[num]
+
+        entry = self.xref.get(num)
+        if entry is None:
+            value = None
+        elif entry[0] == 'offset':
+            found, value = self.parser.parse_indirect(entry[1])
+            if found != num:
+                raise PdfError(f"Cross-reference entry of object {num} points to object {found}")
+        else:
+            parser, header = self.get_object_stream(entry[1])
+            member, offset = header[entry[2]]
+            if member != num:
+                raise PdfError(f"Object stream {entry[1]} does not hold object {num}")
+            value, _ = parser.parse_object(offset)
+
+        self._objects[num] = value
+        return value
+
+    def resolve(self, value):
+        for _ in range(MAX_NESTING):
+            if not isinstance(value, Ref):
+                return value
+            value = self.get_object(value.num)
+        raise PdfError("Reference chain is too long")
+
+    def read_info(self) -> PdfInfo:
+        if 'Encrypt' in self.trailer:
+            raise PdfEncryptedError("Document is encrypted")
+
+        root = self.resolve(self.trailer.get('Root'))
+        if not isinstance(root, dict):
+            raise PdfError("Missing document catalog")
+
+        info = PdfInfo()
+        pages = self.resolve(root.get('Pages'))
+        if isinstance(pages, dict):
+            count = self.resolve(pages.get('Count'))
+            if isinstance(count, int):
+                info.page_count = count
+
+        info_dict = self.resolve(self.trailer.get('Info'))
+        if isinstance(info_dict, dict):
+            info.creator = decode_text(self.resolve(info_dict.get('Creator')))
+            info.create_date = parse_date(decode_text(self.resolve(info_dict.get('CreationDate'))))
+            info.modify_date = parse_date(decode_text(self.resolve(info_dict.get('ModDate'))))
+
+        return info
+
+
+def apply_predictor(data: bytes, params: Dict) -> bytes:
+    predictor = params.get('Predictor', 1)
+    if predictor == 1:
+        return data
+    if predictor < 10:
+        raise PdfError(f"Unsupported predictor {predictor}")
+
+    colors = params.get('Colors', 1)
+    bits = params.get('BitsPerComponent', 8)
+    columns = params.get('Columns', 1)
+    bpp = max(1, colors * bits // 8)
+    row_length = (colors * bits * columns + 7) // 8
+
+    output = bytearray()
+    previous = bytearray(row_length)
+    for pos in range(0, len(data) - row_length, row_length + 1):
+        png_filter = data[pos]
+        row = bytearray(data[pos + 1:pos + 1 + row_length])
+        if png_filter == 1:
+            for i in range(bpp, row_length):
+                row[i] = (row[i] + row[i - bpp]) & 0xFF
+        elif png_filter == 2:
+            for i in range(row_length):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif png_filter == 3:
+            for i in range(row_length):
+                left = row[i - bpp] if i >= bpp else 0
+                row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xFF
+        elif png_filter == 4:
+            for i in range(row_length):
+                left = row[i - bpp] if i >= bpp else 0
+                up_left = previous[i - bpp] if i >= bpp else 0
+                estimate = left + previous[i] - up_left
+                distances = abs(estimate - left), abs(estimate - previous[i]), abs(estimate - up_left)
+                if distances[0] <= distances[1] and distances[0] <= distances[2]:
+                    predicted = left
+                elif distances[1] <= distances[2]:
+                    predicted = previous[i]
+                else:
+                    predicted = up_left
+                row[i] = (row[i] + predicted) & 0xFF
+        output += row
+        previous = row
+    return bytes(output)
+
+
+def decode_text(value) -> str | None:
+    if not isinstance(value, bytes):
+        return None
+    if value.startswith(b'\xfe\xff'):
+        return value[2:].decode('utf-16-be', errors='replace')
+    if value.startswith(b'\xff\xfe'):
+        return value[2:].decode('utf-16-le', errors='replace')
+    if value.startswith(b'\xef\xbb\xbf'):
+        return value[3:].decode('utf-8', errors='replace')
+    return value.decode('latin-1').translate(PDF_DOC_DECODING_TABLE)
+
+
+def parse_date(value: str | None) -> datetime | None:
+    match = DATE_REGEX.match(value.strip()) if value else None
+    if not match:
+        return None
+
+    year, month, day, hour, minute, second, sign, tz_hour, tz_minute = match.groups()
+    tzinfo = None
+    if sign in ('Z', 'z'):
+        tzinfo = timezone.utc
+    elif sign:
+        offset = timedelta(hours=int(tz_hour or 0), minutes=int(tz_minute or 0))
+        tzinfo = timezone(-offset if sign == '-' else offset)
+
+    try:
+        return datetime(
+            int(year), int(month or 1), int(day or 1),
+            int(hour or 0), int(minute or 0), int(second or 0), tzinfo=tzinfo
+        )
+    except ValueError:
+        return None
+
+
+def parse_pdf_info(data) -> PdfInfo:
+    if data.find(b'%PDF-', 0, 1024) == -1:
+        raise PdfError("Missing %PDF- header")
+
+    document = PdfDocument(data)
+    try:
+        document.load_xref()
+        return document.read_info()
+    except PdfEncryptedError:
+        raise
+    except Exception:
+        pass
+
+    document.reconstruct_xref()
+    return document.read_info()
+
+
+def read_pdf_info(path: Path) -> PdfInfo:
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_pdf_info(data)
@@ -1,153 +1,463 @@
+import io
 import logging
 import os
-import xml.dom.minidom
+import tempfile
 import zipfile
+from contextlib import nullcontext
 from datetime import datetime, date
 from pathlib import Path
-from typing import List, Dict
+from typing import BinaryIO, List, Dict, Callable, Iterator, Tuple
 
 from olefile import OleMetadata, olefile
 
-from src.decoding import decode_nullable
-from .simple_exiftool import SimpleExifTool
+from src import instrumentation
+from src.decoding import decode_nullable, ArchiveNameDecoder
+from .cache import MetadataCache
+from .deadlines import FileTimeoutError, deadline
+from .dedup import ContentIndex, hash_source
+from .docprops import read_docprops
+from .extraction import ArchiveExtractor, ArchiveLimitError, ExtractionLimitError, ExtractionLimits, SpooledSource
+from .metadata import Metadata, MetadataTable
+from .ole import OleSummary, NotOleFileError, read_ole_summary, parse_ole_summary
+from .pdf import PdfInfo, read_pdf_info, parse_pdf_info
+from .simple_exiftool import SimpleExifTool, ExifToolPool
+from .sniffing import register_signature, sniff_file, sniff_filetype, SNIFF_SIZE
+from .walking import PathFilter, walk_files
 
+# Bump whenever readers change what they extract, so cached metadata gets read again
+READER_VERSION = 4
 
-class Metadata:
+# The only exiftool tags used for pdf files, exiftool skips formatting all others
+PDF_TAGS = ['PDF:PageCount', 'PDF:Creator', 'PDF:CreateDate', 'PDF:ModifyDate']
 
-    def __init__(self, path):
-        self.path = path
-        self.filename = os.path.basename(self.path)
-        _, self.extension = os.path.splitext(self.path)
-        self.extension = self.extension[1:]
+DOCX_CORE_TAGS = ['dc:creator', 'cp:lastModifiedBy', 'dcterms:created', 'dcterms:modified', 'cp:lastPrinted']
+DOCX_APP_TAGS = ['Template', 'TotalTime', 'Pages']
 
-        self.pages: str | None = None
-        self.template: str | None = None
 
-        self.total_time: int | None = None  # In minutes
+Reader = Callable[[Path, ExifToolPool | None, bytes | None, ExtractionLimits | None], Metadata]
 
-        self.creator: str | None = None
-        self.last_modified_by: str | None = None
+# Readers by the filetype sniffed from the content, they take the path, an exiftool, the optional content
+# and the limits for formats that are archives themselves.
+# Files of a submission are reported grouped by filetype, in the order of this table.
+READERS: Dict[str, Reader] = {
+    'doc': lambda path, exif_tool, source, limits: read_metadata_from_doc(path, source),
+    'docx': lambda path, exif_tool, source, limits: read_metadata_from_docx(path, source, limits),
+    'pdf': lambda path, exif_tool, source, limits: read_metadata_from_pdf(path, exif_tool, source),
+}
 
-        self.date_created: datetime | None = None
-        self.date_modified: datetime | None = None
-        self.last_printed: datetime | None = None
 
+# Adds a format recognized by `magic`, its files are walked, extracted from archives and read like the others
+def register_reader(
+        filetype: str,
+        reader: Reader,
+        magic: bytes,
+        max_offset: int = 0
+):
+    READERS[filetype] = reader
+    register_signature(filetype, magic, max_offset)
+
+
+def filetype_buckets() -> Dict[str, List]:
+    return {filetype: [] for filetype in READERS}
+
+
+# Files of another format than their extension says are read by the right reader, files of an
+# unrecognized format by the reader of their extension. Extensionless files are read only if recognized.
+def detect_filetype(file_path, source: bytes | None = None) -> str | None:
+    filetype = sniff_file(file_path) if source is None else sniff_filetype(source)
+    if filetype in READERS:
+        return filetype
 
-def read_metadata(file_path) -> Metadata:
     _, extension = os.path.splitext(file_path)
+    extension = extension.lower()[1:]
+    if extension in READERS:
+        logging.warning(f"Format of {file_path} was not recognized, reading it as {extension}")
+        return extension
+    return None
+
+
+# `source` optionally holds the file content, e.g. an archive member, `file_path` then only names it.
+# None for unreadable docx files, which are left out of the report wherever they were found.
+def read_metadata(
+        file_path,
+        exif_tool: ExifToolPool | None = None,
+        source: bytes | None = None,
+        cache: MetadataCache | None = None,
+        filetype: str | None = None,
+        timeout: float | None = None,
+        index: ContentIndex | None = None,
+        limits: ExtractionLimits | None = None
+) -> Metadata | None:
+    filetype = filetype or detect_filetype(file_path, source)
+
+    # Content is only hashed with an index, copies of content read before are taken from it
+    content_hash = None
+    if index is not None:
+        content_hash = hash_source(file_path, source)
+        duplicate = index.get(content_hash, file_path)
+        if duplicate is not None:
+            instrumentation.count('duplicates_skipped')
+            return duplicate
+
+    cache_key = None
+    if cache is not None:
+        cache_key = metadata_cache_key(file_path, filetype, source, content_hash)
+        cached = read_cached_metadata(cache, cache_key, file_path)
+        if cached is not None:
+            cached.content_hash = content_hash or cached.content_hash
+            return cached
+
+    if filetype == 'docx':
+        metadata = read_within(file_path, timeout, lambda: read_docx_or_none(file_path, source, limits))
+    else:
+        metadata = read_within(
+            file_path, timeout, lambda: read_metadata_by_filetype(file_path, filetype, exif_tool, source, limits)
+        )
+    if metadata is None:
+        return None
+    metadata.content_hash = content_hash
+    if cache_key and not metadata.is_empty():
+        cache.put(cache_key, cache_value(metadata, filetype))
+    if index is not None:
+        index.put(content_hash, metadata)
+    return metadata
+
+
+def metadata_cache_key(
+        file_path, filetype: str | None, source: bytes | None = None, content_hash: str | None = None
+) -> str | None:
     try:
-        if extension == '.docx':
-            return read_metadata_from_docx(file_path)
-        elif extension == '.doc':
-            return read_metadata_from_doc(file_path)
-        elif extension == '.pdf':
-            try:
-                with SimpleExifTool() as exif_tool:
-                    return read_metadata_from_pdf(file_path, exif_tool)
-            except Exception as e:
-                logging.error(f"Error extracting metadata from pdf format, "
-                              f"perhaps Exiftool is not installed.\n"
-                              f"Cause: {e}"
-                )
+        if source is None:
+            return MetadataCache.file_key(file_path)
+        return MetadataCache.content_key(filetype, source, content_hash)
+    except OSError as e:
+        logging.warning(f"Could not compute cache key for {file_path}: {e}")
+        return None
+
+
+# Cached metadata of a file also names its sniffed filetype, so walks of unchanged trees need not open it
+def cache_value(metadata: Metadata, filetype: str | None) -> List[Dict]:
+    return [dict(metadata.to_dict(), filetype=filetype)]
+
+
+def cached_filetype(cache: MetadataCache, cache_key: str | None) -> str | None:
+    cached = cache.get(cache_key) if cache_key else None
+    filetype = cached[0].get('filetype') if cached else None
+    return filetype if filetype in READERS else None
+
+
+def read_cached_metadata(cache: MetadataCache, cache_key: str | None, file_path) -> Metadata | None:
+    cached = cache.get(cache_key) if cache_key else None
+    if cached:
+        instrumentation.count('cache_hits')
+        return Metadata.from_dict(cached[0], file_path)
+    instrumentation.count('cache_misses')
+    return None
+
+
+# Files over their time budget of `timeout` seconds come out empty, with the timeout as their error
+def read_within(file_path, timeout: float | None, read: Callable[[], Metadata | None]) -> Metadata | None:
+    try:
+        with deadline(timeout, file_path):
+            return read()
+    except FileTimeoutError:
+        return timed_out(file_path, timeout)
+
+
+def timed_out(file_path, timeout: float) -> Metadata:
+    error = f"Reading {file_path} took longer than {timeout:g} seconds"
+    logging.error(error)
+    instrumentation.error('read', 'timeout')
+    metadata = Metadata(file_path)
+    metadata.error = error
+    return metadata
+
+
+def read_metadata_by_filetype(
+        file_path,
+        filetype: str | None,
+        exif_tool: ExifToolPool | None = None,
+        source: bytes | None = None,
+        limits: ExtractionLimits | None = None
+) -> Metadata:
+    try:
+        reader = READERS.get(filetype)
+        if reader is not None:
+            return reader(file_path, exif_tool, source, limits)
 
     except Exception as e:
         logging.error(f"Error processing file: {file_path}\nCause {str(e)}")
     return Metadata(file_path)
 
 
-def read_metadata_recursively(path: Path) -> List[Metadata]:
+def read_metadata_recursively(
+        path: Path,
+        exif_tool: ExifToolPool | None = None,
+        cache: MetadataCache | None = None,
+        path_filter: PathFilter | None = None,
+        timeout: float | None = None,
+        index: ContentIndex | None = None,
+        limits: ExtractionLimits | None = None
+) -> MetadataTable:
     if not path.is_dir():
         logging.warning(f"Path is not a directory: {path}")
-        return []
+        return MetadataTable()
 
-    filetype_to_paths = collect_metadata_paths(path)
+    filetype_to_paths = collect_metadata_paths(path, path_filter, cache)
 
-    metadatas: List[Metadata] = []
-    for doc_path in filetype_to_paths['doc']:  # type: Path
-        metadatas.append(read_metadata_from_doc(doc_path))
+    metadatas = MetadataTable()
+    for filetype, paths in filetype_to_paths.items():
+        read = batch_reader(filetype, exif_tool, timeout, limits)
+        metadatas.extend(read_with_cache(
+            paths, lambda missing_paths: read_deduplicated(missing_paths, read, index), cache, filetype
+        ))
 
-    for docx_path in filetype_to_paths['docx']:
-        try:
-            metadatas.append(read_metadata_from_docx(docx_path))
-        except Exception as e:
-            logging.warning(f"Error extracting metadata from {docx_path}.\nCause: {e}")
+    return metadatas
 
-    if len(filetype_to_paths['pdf']) > 0:
-        try:
-            with SimpleExifTool() as exif_tool:
-                for pdf_path in filetype_to_paths['pdf']:  # type: Path
-                    metadatas.append(read_metadata_from_pdf(pdf_path, exif_tool))
-        except Exception as e:
-            logging.error(f"Error extracting metadata from pdf format, "
-                          f"perhaps Exiftool is not installed.\n"
-                          f"Cause: {e}"
-            )
 
+# Reads all files of `filetype` at once, formats without a reader of their own are read file by file
+def batch_reader(
+        filetype: str,
+        exif_tool: ExifToolPool | None = None,
+        timeout: float | None = None,
+        limits: ExtractionLimits | None = None
+) -> Callable[[List[Path]], List[Metadata | None]]:
+    if filetype == 'doc':
+        return lambda paths: read_metadata_from_docs(paths, timeout)
+    if filetype == 'docx':
+        return lambda paths: read_metadata_from_docxs(paths, timeout, limits)
+    if filetype == 'pdf':
+        return lambda paths: read_metadata_from_pdfs(paths, exif_tool, None, timeout)
+    return lambda paths: [
+        read_within(path, timeout, lambda: read_metadata_by_filetype(path, filetype, exif_tool, None, limits))
+        for path in paths
+    ]
+
+
+# Only paths missing from the cache are handed to `read`, None results are dropped from the output
+def read_with_cache(
+        paths: List[Path],
+        read: Callable[[List[Path]], List[Metadata | None]],
+        cache: MetadataCache | None = None,
+        filetype: str | None = None
+) -> List[Metadata]:
+    if cache is None:
+        return [metadata for metadata in read(paths) if metadata is not None]
+
+    keys = [metadata_cache_key(path, None) for path in paths]
+    metadatas: List[Metadata | None] = []
+    missing: List[int] = []
+    for i, (path, key) in enumerate(zip(paths, keys)):
+        cached = cache.get(key) if key else None
+        metadatas.append(Metadata.from_dict(cached[0], path) if cached else None)
+        if not cached:
+            missing.append(i)
+
+    instrumentation.count('cache_hits', len(paths) - len(missing))
+    instrumentation.count('cache_misses', len(missing))
+    if missing:
+        for i, metadata in zip(missing, read([paths[i] for i in missing])):
+            metadatas[i] = metadata
+            if keys[i] and metadata is not None and not metadata.is_empty():
+                cache.put(keys[i], cache_value(metadata, filetype))
+
+    return [metadata for metadata in metadatas if metadata is not None]
+
+
+# Without an index every path is handed to `read`. With one, files are hashed and copies of content read
+# before, or earlier in `paths`, take over its metadata, only the first copy of each content is read.
+# Copies of a first copy that failed or came out empty are read as well, like the index does not keep them.
+def read_deduplicated(
+        paths: List[Path],
+        read: Callable[[List[Path]], List[Metadata | None]],
+        index: ContentIndex | None = None
+) -> List[Metadata | None]:
+    if index is None:
+        return read(paths)
+
+    hashes = [hash_source(path) for path in paths]
+    metadatas: List[Metadata | None] = [index.get(content_hash, path) for path, content_hash in zip(paths, hashes)]
+    first: Dict[str, int] = {}
+    missing: List[int] = []
+    for i, (content_hash, metadata) in enumerate(zip(hashes, metadatas)):
+        if metadata is None and (content_hash is None or content_hash not in first):
+            missing.append(i)
+            if content_hash is not None:
+                first[content_hash] = i
+
+    for i, metadata in zip(missing, read([paths[i] for i in missing])):
+        if metadata is not None:
+            metadata.content_hash = hashes[i]
+            index.put(hashes[i], metadata)
+        metadatas[i] = metadata
+
+    unusable: List[int] = []
+    for i, content_hash in enumerate(hashes):
+        original = first.get(content_hash, i)
+        if original == i:
+            continue
+        metadata = metadatas[original]
+        if metadata is not None and metadata.error is None and not metadata.is_empty():
+            metadatas[i] = Metadata.from_dict(metadata.to_dict(), paths[i])
+        else:
+            unusable.append(i)
+
+    for i, metadata in zip(unusable, read([paths[i] for i in unusable]) if unusable else []):
+        if metadata is not None:
+            metadata.content_hash = hashes[i]
+        metadatas[i] = metadata
+    instrumentation.count('duplicates_skipped', len(paths) - len(missing) - len(unusable))
     return metadatas
 
 
-def collect_metadata_paths(path) -> Dict[str, List[Path]]:
-    filetype_to_paths: Dict[str, List[Path]] = {
-        'docx': [],
-        'doc': [],
-        'pdf': []
-    }
+def read_metadata_from_docs(paths: List[Path], timeout: float | None = None) -> List[Metadata]:
+    return [read_within(doc_path, timeout, lambda: read_metadata_from_doc(doc_path)) for doc_path in paths]
 
-    for child in Path(path).rglob('*'):  # type: Path
-        if child.is_dir():
-            continue
 
-        if child.name.startswith('.'):
-            continue
+def read_metadata_from_docxs(
+        paths: List[Path], timeout: float | None = None, limits: ExtractionLimits | None = None
+) -> List[Metadata | None]:
+    return [
+        read_within(docx_path, timeout, lambda: read_docx_or_none(docx_path, None, limits)) for docx_path in paths
+    ]
 
-        filetype = child.suffix.lower()[1:]
-        if filetype in filetype_to_paths.keys():
-            logging.info(f"Found submission file {child}")
-            filetype_to_paths[filetype].append(child)
 
-    return filetype_to_paths
+def read_docx_or_none(
+        path: Path, source: bytes | None = None, limits: ExtractionLimits | None = None
+) -> Metadata | None:
+    try:
+        return read_metadata_from_docx(path, source, limits)
+    except Exception as e:
+        logging.warning(f"Error extracting metadata from {path}.\nCause: {e}")
+        return None
 
 
-def read_metadata_from_docx(path: Path) -> Metadata:
-    metadata: Metadata = Metadata(path)
-    date_format = "%Y-%m-%dT%H:%M:%SZ"  # 2021-12-20T18:41:00Z
-    with zipfile.ZipFile(str(path), 'r') as zipf:
-        try:
-            core = xml.dom.minidom.parseString(zipf.read('docProps/core.xml'))
-            metadata.creator = get_dom_element_as_text(core, 'dc:creator')
-            metadata.last_modified_by = get_dom_element_as_text(core, 'cp:lastModifiedBy')
+# Files are sniffed for their format unless the cache already knows them by path, size and mtime
+def collect_metadata_paths(
+        path, path_filter: PathFilter | None = None, cache: MetadataCache | None = None
+) -> Dict[str, List[Path]]:
+    filetype_to_paths: Dict[str, List[Path]] = filetype_buckets()
+
+    with instrumentation.span('walk'):
+        for entry in walk_files(path, path_filter):
+            _, extension = os.path.splitext(entry.name)
+            # Files with other extensions are skipped without being opened
+            if extension and extension.lower()[1:] not in filetype_to_paths.keys():
+                continue
+
+            filetype = None
+            if cache is not None:
+                filetype = cached_filetype(cache, metadata_cache_key(entry.path, None))
+            if filetype is None:
+                filetype = detect_filetype(entry.path)
+            if filetype in filetype_to_paths.keys():
+                child = Path(entry.path)
+                logging.info(f"Found submission file {child}")
+                filetype_to_paths[filetype].append(child)
 
-            created = get_dom_element_as_text(core, 'dcterms:created')
-            metadata.date_created = nullable_str_to_datetime(created, date_format)
+    return filetype_to_paths
 
-            modified = get_dom_element_as_text(core, 'dcterms:modified')
-            metadata.date_modified = nullable_str_to_datetime(modified, date_format)
 
-            last_printed = get_dom_element_as_text(core, 'cp:lastPrinted')
-            metadata.last_printed = nullable_str_to_datetime(last_printed, date_format)
+# Yields the path, sniffed filetype and content of each supported member, extracted within `limits`.
+# Members breaking a limit are skipped, all remaining ones once the archive exceeds its size limit.
+# Members are named by the archive path and their basename, decoded with the encoding of the archive.
+# Spooled contents stay open until the caller hands them to close_source.
+def iter_archive_members(
+        zf: zipfile.ZipFile,
+        path: Path,
+        path_filter: PathFilter | None = None,
+        limits: ExtractionLimits | None = None
+) -> Iterator[Tuple[Path, str, bytes | SpooledSource]]:
+    name_decoder = ArchiveNameDecoder(zf.infolist())
+    extractor = ArchiveExtractor(zf, limits)
+    for member in zf.infolist():  # type ZipInfo
+        if member.is_dir():
+            continue
 
-        except Exception as e:
-            logging.warning(f"Document does not have core xml: {path}")
+        basename = os.path.basename(member.filename)
+        _, extension = os.path.splitext(basename)
 
+        if path_filter and not path_filter.match(member.filename):
+            continue
+
+        if basename.startswith('.'):
+            continue
+        # Members with other extensions are skipped unread, extensionless ones only if recognized
+        if extension and extension[1:].lower() not in READERS:
+            continue
+        if not extension:
+            with zf.open(member) as member_file:
+                if sniff_filetype(member_file.read(SNIFF_SIZE)) not in READERS:
+                    continue
+
+        member_path = path / name_decoder.decode(member)
         try:
-            app = xml.dom.minidom.parseString(zipf.read('docProps/app.xml'))
-            metadata.template = get_dom_element_as_text(app, 'Template')
-            totalTime: str = get_dom_element_as_text(app, 'TotalTime')
-            metadata.total_time = int(totalTime) if len(totalTime) > 0 else 0
+            with instrumentation.span('extract', extension[1:].lower() or None, member_path):
+                data = extractor.extract(member)
+        except ArchiveLimitError as e:
+            logging.error(f"Skipping the rest of {path}: {e}")
+            return
+        except (ExtractionLimitError, zipfile.BadZipFile) as e:
+            logging.warning(f"Skipping archive member {member_path}: {e}")
+            continue
 
-            metadata.pages = get_dom_element_as_text(app, 'Pages')
+        filetype = detect_filetype(member_path, data)
+        if filetype in READERS:
+            logging.info(f"Found submission file {member_path}")
+            yield member_path, filetype, data
+
+
+# In-memory content of a file as a seekable file object
+def source_file(source: bytes | SpooledSource) -> BinaryIO:
+    if isinstance(source, SpooledSource):
+        source.seek(0)
+        return source
+    return io.BytesIO(source)
+
+
+# The docProps parts are streamed into the parser within `limits`, like members of a submission archive
+def read_metadata_from_docx(
+        path: Path, source: bytes | None = None, limits: ExtractionLimits | None = None
+) -> Metadata:
+    with instrumentation.span('read', 'docx', path):
+        metadata: Metadata = Metadata(path)
+        date_format = "%Y-%m-%dT%H:%M:%SZ"  # 2021-12-20T18:41:00Z
+        with zipfile.ZipFile(source_file(source) if source is not None else str(path), 'r') as zipf:
+            parts = ArchiveExtractor(zipf, limits)
+            try:
+                core = read_docprops(parts.iter_member('docProps/core.xml'), DOCX_CORE_TAGS)
+                metadata.creator = core.get('dc:creator')
+                metadata.last_modified_by = core.get('cp:lastModifiedBy')
 
-        except Exception as e:
-            logging.warning(f"Document does not have app xml: {path}")
+                created = core.get('dcterms:created')
+                metadata.date_created = nullable_str_to_datetime(created, date_format)
 
-    return metadata
+                modified = core.get('dcterms:modified')
+                metadata.date_modified = nullable_str_to_datetime(modified, date_format)
 
+                last_printed = core.get('cp:lastPrinted')
+                metadata.last_printed = nullable_str_to_datetime(last_printed, date_format)
 
-def get_dom_element_as_text(doc, tag_name) -> str | None:
-    try:
-        return doc.getElementsByTagName(tag_name)[0].childNodes[0].data
-    except (IndexError, AttributeError):
-        return None
+            except ExtractionLimitError as e:
+                logging.warning(f"Skipping core xml of {path}: {e}")
+            except Exception as e:
+                logging.warning(f"Document does not have core xml: {path}")
+
+            try:
+                app = read_docprops(parts.iter_member('docProps/app.xml'), DOCX_APP_TAGS)
+                metadata.template = app.get('Template')
+                totalTime: str | None = app.get('TotalTime')
+                metadata.total_time = int(totalTime) if totalTime else 0
+
+                pages: str | None = app.get('Pages')
+                metadata.pages = int(pages) if pages and pages.strip().isdigit() else None
+
+            except ExtractionLimitError as e:
+                logging.warning(f"Skipping app xml of {path}: {e}")
+            except Exception as e:
+                logging.warning(f"Document does not have app xml: {path}")
+
+        return metadata
 
 
 def nullable_str_to_datetime(date: str | None, time_pattern: str) -> datetime | None:
@@ -156,46 +466,155 @@ def nullable_str_to_datetime(date: str | None, time_pattern: str) -> datetime |
     return None
 
 
-def read_metadata_from_doc(path: Path) -> Metadata:
+def read_metadata_from_doc(path: Path, source: bytes | None = None) -> Metadata:
+    try:
+        with instrumentation.span('read', 'doc', path):
+            summary = read_ole_summary(path) if source is None else parse_ole_summary(source)
+    except NotOleFileError:
+        logging.warning(f"Path is not a valid DOC file: {path}")
+        return Metadata(path)
+    except Exception as e:
+        logging.info(f"Falling back to olefile for {path}.\nCause: {e}")
+        instrumentation.count('olefile_fallbacks')
+        return read_metadata_from_doc_with_olefile(path, source)
+
+    return doc_metadata_from_summary(path, summary)
+
+
+def read_metadata_from_doc_with_olefile(path: Path, source: bytes | None = None) -> Metadata:
     metadata = Metadata(path)
+    # olefile takes a file-like object in place of a filename
+    ole_source = source_file(source) if source is not None else str(path)
     try:
-        if not olefile.isOleFile(str(path)):
-            logging.warning(f"Path is not a valid DOC file: {path}")
-            return metadata
+        with instrumentation.span('olefile', 'doc', path):
+            if not olefile.isOleFile(ole_source):
+                logging.warning(f"Path is not a valid DOC file: {path}")
+                return metadata
 
-        # date_format = "%Y-%m-%d %H:%M:%s"  # "2021-12-09 20:08:00"
-        with olefile.OleFileIO(str(path)) as ofile:
+            with olefile.OleFileIO(ole_source) as ofile:
+                metadata = doc_metadata_from_summary(path, ofile.get_metadata())
 
-            olemetadata: OleMetadata = ofile.get_metadata()
-            metadata.total_time = olemetadata.total_edit_time
-            metadata.template = decode_nullable(olemetadata.template)
-            metadata.creator = decode_nullable(olemetadata.author)
-            metadata.last_modified_by = decode_nullable(olemetadata.last_saved_by)
-            metadata.date_created = olemetadata.create_time
+    except Exception as e:
+        logging.error(f"Error reading metadata for {path}: {e}")
 
-            metadata.date_modified = olemetadata.last_saved_time
-            metadata.last_printed = olemetadata.last_printed
+    return metadata
 
-            metadata.pages = olemetadata.num_pages
-            # TODO: move this filtering to results
-            if metadata.last_printed and metadata.last_printed.date() < date(1900, 1, 1):
-                metadata.last_printed = None
 
-            if metadata.total_time:
-                metadata.total_time //= 60
+# Takes olefile's OleMetadata or an OleSummary, which has the same attributes
+def doc_metadata_from_summary(path: Path, summary: OleSummary | OleMetadata) -> Metadata:
+    metadata = Metadata(path)
+    # date_format = "%Y-%m-%d %H:%M:%s"  # "2021-12-09 20:08:00"
+    metadata.total_time = summary.total_edit_time
+    metadata.template = decode_nullable(summary.template)
+    metadata.creator = decode_nullable(summary.author)
+    metadata.last_modified_by = decode_nullable(summary.last_saved_by)
+    metadata.date_created = summary.create_time
+
+    metadata.date_modified = summary.last_saved_time
+    metadata.last_printed = summary.last_printed
+
+    metadata.pages = summary.num_pages
+    # TODO: move this filtering to results
+    if metadata.last_printed and metadata.last_printed.date() < date(1900, 1, 1):
+        metadata.last_printed = None
+
+    if metadata.total_time:
+        metadata.total_time //= 60
+
+    return metadata
+
+
+def read_metadata_from_pdf(
+        path: Path, exif_tool: SimpleExifTool | ExifToolPool | None = None, source: bytes | None = None
+) -> Metadata:
+    return read_metadata_from_pdfs([path], exif_tool, [source])[0]
+
+
+def read_metadata_from_pdfs(
+        paths: List[Path],
+        exif_tool: SimpleExifTool | ExifToolPool | None = None,
+        sources: List[bytes | None] | None = None,
+        timeout: float | None = None
+) -> List[Metadata]:
+    sources = sources or [None] * len(paths)
+    metadatas = [
+        read_within(path, timeout, lambda: read_metadata_from_pdf_natively(path, source))
+        for path, source in zip(paths, sources)
+    ]
+
+    fallback = [(path, source) for path, source, metadata in zip(paths, sources, metadatas) if metadata is None]
+    if fallback:
+        fallback_paths, fallback_sources = zip(*fallback)
+        fallback_metadatas = iter(read_metadata_from_pdfs_with_exiftool(
+            list(fallback_paths), exif_tool, list(fallback_sources), timeout
+        ))
+        metadatas = [metadata if metadata is not None else next(fallback_metadatas) for metadata in metadatas]
+
+    return metadatas
+
 
+# None if the pdf has to be read by exiftool
+def read_metadata_from_pdf_natively(path: Path, source: bytes | None = None) -> Metadata | None:
+    try:
+        with instrumentation.span('read', 'pdf', path):
+            info = read_pdf_info(path) if source is None else parse_pdf_info(source)
+        return pdf_metadata_from_info(path, info)
     except Exception as e:
-        logging.error(f"Error reading metadata for {path}: {e}")
+        logging.info(f"Falling back to exiftool for {path}.\nCause: {e}")
+        instrumentation.count('exiftool_fallbacks')
+        return None
+
+
+# Exiftool of its own gives up on a file after `timeout` seconds, a passed in one after its own timeout
+def read_metadata_from_pdfs_with_exiftool(
+        paths: List[Path],
+        exif_tool: SimpleExifTool | ExifToolPool | None = None,
+        sources: List[bytes | None] | None = None,
+        timeout: float | None = None
+) -> List[Metadata]:
+    sources = sources or [None] * len(paths)
+    try:
+        # Exiftool is only started once some pdf could not be read natively. Batches of several files
+        # are timed as a whole, their time is not attributed to any one file.
+        with instrumentation.span('exiftool', 'pdf', paths[0] if len(paths) == 1 else None), \
+                nullcontext(exif_tool) if exif_tool else SimpleExifTool(timeout=timeout) as exif_tool, \
+                tempfile.TemporaryDirectory() as tempdir:
+            # Exiftool needs a file on disk, in-memory sources are only written out at this point
+            exif_paths = []
+            for i, (path, source) in enumerate(zip(paths, sources)):
+                if source is None:
+                    exif_paths.append(str(path))
+                else:
+                    exif_path = os.path.join(tempdir, f"{i}.pdf")
+                    with open(exif_path, 'wb') as target:
+                        target.write(source)
+                    exif_paths.append(exif_path)
+
+            exif_datas = exif_tool.get_metadata_many(exif_paths, PDF_TAGS)
+    except Exception as e:
+        logging.error(f"Error extracting metadata from pdf format, "
+                      f"perhaps Exiftool is not installed.\n"
+                      f"Cause: {e}"
+        )
+        return [Metadata(path) for path in paths]
+
+    return [pdf_metadata_from_exif(path, exif_data) for path, exif_data in zip(paths, exif_datas)]
 
+
+def pdf_metadata_from_info(path: Path, info: PdfInfo) -> Metadata:
+    metadata = Metadata(path)
+    metadata.pages = info.page_count
+    metadata.creator = info.creator
+    metadata.date_created = info.create_date
+    metadata.date_modified = info.modify_date
     return metadata
 
 
-def read_metadata_from_pdf(path: Path, exif_tool: SimpleExifTool) -> Metadata:
+def pdf_metadata_from_exif(path: Path, exif_data: Dict) -> Metadata:
     metadata = Metadata(path)
     date_format = '%Y:%m:%d %H:%M:%S%z'  # 2021:12:14 17:52:05+00:00
     # modify_date_format = '%Y:%m:%d %H:%M:%S%z' # 2021:12:14 17:59:55Z
     try:
-        exif_data = exif_tool.get_metadata(str(path))[0]
         metadata.pages = exif_data.get('PDF:PageCount')
         metadata.creator = exif_data.get('PDF:Creator')
 
@@ -203,6 +622,9 @@ def read_metadata_from_pdf(path: Path, exif_tool: SimpleExifTool) -> Metadata:
         metadata.date_created = nullable_str_to_datetime(created, date_format)
         modified = exif_data.get('PDF:ModifyDate')
         metadata.date_modified = nullable_str_to_datetime(modified, date_format)
+        metadata.error = exif_data.get('ExifTool:Error')
+        if metadata.error:
+            instrumentation.error('exiftool', metadata.error)
     except Exception as e:
         logging.error(f"Error reading metadata for {path}: {e}")
 
@@ -1,16 +1,60 @@
+import asyncio
+import itertools
 import json
+import logging
+import math
 import os
+import queue
+import select
 import subprocess
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from typing import List, Dict, Iterable
+
+
+# Seconds a batch is given for each file beyond the first, on top of the time budget of a single file
+BATCH_FILE_ALLOWANCE = 0.5
+# Largest batch once files have a time budget, a stalled file is noticed after at most
+# batch_timeout(timeout, TIMED_BATCH_SIZE) seconds and only its batch is read again one by one
+TIMED_BATCH_SIZE = 20
+
+
+# A stalled batch is noticed about as early as a single stalled file, not after the budget of every file in it
+def batch_timeout(timeout: float | None, files: int) -> float | None:
+    return timeout + BATCH_FILE_ALLOWANCE * (files - 1) if timeout else None
+
+
+def batch_size_for(batch_size: int, timeout: float | None) -> int:
+    return min(batch_size, TIMED_BATCH_SIZE) if timeout else batch_size
+
+
+# Exiftool entry of a file exiftool did not answer for within its time budget
+def timeout_entry(path: str, timeout: float) -> Dict:
+    logging.error(f"Exiftool did not read {path} within {timeout:g} seconds")
+    return {'ExifTool:Error': f"Timed out after {timeout:g} seconds"}
+
+
+class ExifToolTimeoutError(TimeoutError):
+    pass
 
 
 class SimpleExifTool(object):
-    sentinel = "{ready}\n"
+    # Every request is tagged with -executeNUM, so exiftool answers it with a numbered sentinel
+    sentinel = "{{ready{}}}\n"
+
+    # windows_sentinel = "{{ready{}}}\r\n"
 
-    # windows_sentinel = "{ready}\r\n"
+    # Seconds given to exiftool to exit on its own before it is killed
+    exit_timeout = 5
 
-    def __init__(self, executable="/usr/bin/exiftool"):
+    # `timeout` is the time budget of a single file in seconds, None waits for exiftool indefinitely
+    def __init__(self, executable="/usr/bin/exiftool", timeout: float | None = None):
         self.executable = executable
+        self.timeout = timeout
+        self._request_ids = itertools.count(1)
 
     def __enter__(self):
         self.process = subprocess.Popen(
@@ -20,23 +64,302 @@ class SimpleExifTool(object):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.process.stdin.write("-stay_open\nFalse\n".encode())
-        self.process.stdin.flush()
+        process = self.process
+        try:
+            if process.poll() is None:
+                process.stdin.write("-stay_open\nFalse\n".encode())
+                process.stdin.flush()
+        except OSError:
+            pass
+
+        try:
+            process.wait(self.exit_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        self.close_pipes()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        self.close_pipes()
+
+    def close_pipes(self):
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
 
     def executable_exists(self):
         return Path(self.executable).exists()
 
-    def execute(self, *args):
-        args = args + ("-execute\n",)
+    # A process that does not answer within `timeout` seconds is killed and a new one started, which
+    # also happens whenever a request is abandoned midway, as the next request would read its answer
+    def execute(self, *args, timeout: float | None = None):
+        request_id = next(self._request_ids)
+        args = args + (f"-execute{request_id}\n",)
         args = str.join("\n", args)
-        self.process.stdin.write(args.encode())
-        self.process.stdin.flush()
-        output = b""
+        try:
+            self.process.stdin.write(args.encode())
+            self.process.stdin.flush()
+            return self.read_response(self.sentinel.format(request_id).encode(), timeout).decode()
+        except BaseException:
+            self.kill()
+            self.__enter__()
+            raise
+
+    def read_response(self, sentinel: bytes, timeout: float | None = None) -> bytes:
+        output = bytearray()
         fd = self.process.stdout.fileno()
-        while not output.endswith(self.sentinel.encode()):
-            output += os.read(fd, 4096)
-        return output.decode()[:-len(self.sentinel)]
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            if deadline is not None:
+                ready, _, _ = select.select([fd], [], [], max(0.0, deadline - time.monotonic()))
+                if not ready:
+                    raise ExifToolTimeoutError(f"Exiftool did not answer within {timeout:g} seconds")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError("Exiftool exited before answering the request")
+
+            # Only the tail that could hold a sentinel split across reads is searched again
+            search_from = max(0, len(output) - len(sentinel) + 1)
+            output += chunk
+            end = output.find(sentinel, search_from)
+            if end != -1:
+                return bytes(output[:end])
 
     def get_metadata(self, path: str):
         a = self.execute("-G1", "-j", "-n", path)
         return json.loads(a)
+
+    # Files exiftool stalls on get a timeout_entry, the rest of their batch is read again one by one
+    def get_metadata_many(self, paths: List[str], tags: Iterable[str] = ()) -> List[Dict]:
+        if not paths:
+            return []
+
+        timeout = batch_timeout(self.timeout, len(paths))
+        try:
+            output = self.execute("-G1", "-j", "-n", *(f"-{tag}" for tag in tags), *paths, timeout=timeout)
+        except ExifToolTimeoutError:
+            if len(paths) == 1:
+                return [timeout_entry(paths[0], self.timeout)]
+            return [entry for path in paths for entry in self.get_metadata_many([path], tags)]
+        return match_entries(output, paths)
+
+
+# Files exiftool could not read are missing from the output, so entries are matched by path
+def match_entries(output: str, paths: List[str]) -> List[Dict]:
+    entries = json.loads(output) if output.strip() else []
+    source_to_entry = {entry.get('SourceFile'): entry for entry in entries}
+    return [source_to_entry.get(path, {}) for path in paths]
+
+
+# Thread-safe pool of long-lived exiftool processes, meant to be shared by the whole run.
+# Processes are spawned lazily, up to `size`, whenever a request finds no idle one.
+class ExifToolPool(object):
+
+    def __init__(self, size=os.cpu_count(), executable="/usr/bin/exiftool", batch_size=200, timeout=None):
+        self.size = max(1, size)
+        self.batch_size = batch_size
+        self.executable = executable
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._tools = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown()
+        with self._lock:
+            for tool in self._tools:
+                tool.__exit__(exc_type, exc_value, traceback)
+            self._tools.clear()
+
+    @property
+    def processes(self) -> int:
+        return len(self._tools)
+
+    @contextmanager
+    def acquire(self):
+        tool = self._take()
+        try:
+            yield tool
+        finally:
+            self._idle.put(tool)
+
+    def _take(self) -> SimpleExifTool:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._tools) < self.size:
+                tool = SimpleExifTool(self.executable, self.timeout).__enter__()
+                self._tools.append(tool)
+                return tool
+
+        return self._idle.get()
+
+    def execute(self, *args):
+        with self.acquire() as tool:
+            return tool.execute(*args)
+
+    def get_metadata(self, path: str):
+        with self.acquire() as tool:
+            return tool.get_metadata(path)
+
+    def get_metadata_many(self, paths: List[str], tags: Iterable[str] = ()) -> List[Dict]:
+        # Batches are spread evenly so that all processes of the pool work on a large request
+        batch_size = min(batch_size_for(self.batch_size, self.timeout), math.ceil(len(paths) / self.size)) or 1
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+        def get_batch(batch: List[str]) -> List[Dict]:
+            with self.acquire() as tool:
+                return tool.get_metadata_many(batch, tags)
+
+        return [entry for entries in self._executor.map(get_batch, batches) for entry in entries]
+
+
+# SimpleExifTool speaking over asyncio subprocess pipes, requests to one process are answered in turn
+class AsyncExifTool(object):
+    sentinel = SimpleExifTool.sentinel
+
+    def __init__(self, executable="/usr/bin/exiftool", timeout: float | None = None):
+        self.executable = executable
+        self.timeout = timeout
+        self._request_ids = itertools.count(1)
+        self._lock: asyncio.Lock | None = None
+        self.broken = False
+
+    async def __aenter__(self):
+        self.process = await asyncio.create_subprocess_exec(
+            self.executable, "-stay_open", "True", "-@", "-",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+        )
+        self._lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.process.returncode is None:
+            try:
+                self.process.stdin.write("-stay_open\nFalse\n".encode())
+                await self.process.stdin.drain()
+                self.process.stdin.close()
+            except ConnectionError:
+                pass
+
+        try:
+            await asyncio.wait_for(self.process.wait(), SimpleExifTool.exit_timeout)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+    async def execute(self, *args, timeout: float | None = None) -> str:
+        async with self._lock:
+            request_id = next(self._request_ids)
+            args = args + (f"-execute{request_id}\n",)
+            try:
+                self.process.stdin.write(str.join("\n", args).encode())
+                await self.process.stdin.drain()
+                try:
+                    response = await asyncio.wait_for(
+                        self.read_response(self.sentinel.format(request_id).encode()), timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise ExifToolTimeoutError(f"Exiftool did not answer within {timeout:g} seconds")
+                return response.decode()
+            except BaseException:
+                # The answer of an abandoned request would be read by the next one, so the process goes
+                self.broken = True
+                if self.process.returncode is None:
+                    self.process.kill()
+                raise
+
+    async def read_response(self, sentinel: bytes) -> bytes:
+        output = bytearray()
+        while True:
+            chunk = await self.process.stdout.read(65536)
+            if not chunk:
+                raise EOFError("Exiftool exited before answering the request")
+
+            search_from = max(0, len(output) - len(sentinel) + 1)
+            output += chunk
+            end = output.find(sentinel, search_from)
+            if end != -1:
+                return bytes(output[:end])
+
+    async def get_metadata_many(self, paths: List[str], tags: Iterable[str] = ()) -> List[Dict]:
+        if not paths:
+            return []
+
+        timeout = batch_timeout(self.timeout, len(paths))
+        output = await self.execute("-G1", "-j", "-n", *(f"-{tag}" for tag in tags), *paths, timeout=timeout)
+        return match_entries(output, paths)
+
+
+# ExifToolPool for a single event loop, processes are spawned lazily up to `size`
+class AsyncExifToolPool(object):
+
+    def __init__(self, size=os.cpu_count(), executable="/usr/bin/exiftool", batch_size=200, timeout=None):
+        self.size = max(1, size)
+        self.batch_size = batch_size
+        self.executable = executable
+        self.timeout = timeout
+        self._idle: asyncio.LifoQueue | None = None
+        self._tools: List[AsyncExifTool] = []
+
+    async def __aenter__(self):
+        self._idle = asyncio.LifoQueue()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        tools, self._tools = self._tools, []
+        await asyncio.gather(
+            *(tool.__aexit__(exc_type, exc_value, traceback) for tool in tools), return_exceptions=True
+        )
+
+    async def _take(self) -> AsyncExifTool:
+        while True:
+            if self._idle.empty() and len(self._tools) < self.size:
+                tool = AsyncExifTool(self.executable, self.timeout)
+                self._tools.append(tool)
+                try:
+                    return await tool.__aenter__()
+                except BaseException:
+                    self._tools.remove(tool)
+                    raise
+
+            tool = await self._idle.get()
+            if not tool.broken:
+                return tool
+            # Processes killed by an abandoned request are replaced
+            self._tools.remove(tool)
+            await tool.__aexit__(None, None, None)
+
+    async def get_metadata_many(self, paths: List[str], tags: Iterable[str] = ()) -> List[Dict]:
+        batch_size = min(batch_size_for(self.batch_size, self.timeout), math.ceil(len(paths) / self.size)) or 1
+
+        async def get_batch(batch: List[str]) -> List[Dict]:
+            tool = await self._take()
+            try:
+                return await tool.get_metadata_many(batch, tags)
+            except ExifToolTimeoutError:
+                if len(batch) == 1:
+                    return [timeout_entry(batch[0], self.timeout)]
+            finally:
+                self._idle.put_nowait(tool)
+
+            # Like SimpleExifTool.get_metadata_many, on processes replacing the killed one
+            entries = await asyncio.gather(*(get_batch([path]) for path in batch))
+            return [entry for path_entries in entries for entry in path_entries]
+
+        batches = await asyncio.gather(*(
+            get_batch(paths[i:i + batch_size]) for i in range(0, len(paths), batch_size)
+        ))
+        return [entry for entries in batches for entry in entries]
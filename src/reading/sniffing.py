@@ -0,0 +1,37 @@
+import logging
+from typing import List, Tuple
+
+# Bytes read from the start of a file to recognize its format
+SNIFF_SIZE = 1024
+
+# Filetype, magic bytes and the largest offset they may start at. Signatures at the very start are checked
+# first, in order, so a zip or OLE file holding a pdf in its first bytes is not taken for one.
+# Readers of further formats register their signature with reading.register_reader.
+SIGNATURES: List[Tuple[str, bytes, int]] = [
+    ('pdf', b'%PDF-', SNIFF_SIZE - 5),  # Readers accept junk before the header, like Acrobat does
+    ('doc', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 0),  # OLE compound file
+    ('docx', b'PK\x03\x04', 0),  # Zip local file header of an OOXML package
+]
+
+
+def register_signature(filetype: str, magic: bytes, max_offset: int = 0):
+    SIGNATURES.append((filetype, magic, max_offset))
+
+
+def sniff_filetype(head: bytes) -> str | None:
+    for filetype, magic, _ in SIGNATURES:
+        if head.startswith(magic):
+            return filetype
+    for filetype, magic, max_offset in SIGNATURES:
+        if max_offset and head.find(magic, 0, max_offset + len(magic)) != -1:
+            return filetype
+    return None
+
+
+def sniff_file(path) -> str | None:
+    try:
+        with open(path, 'rb') as file:
+            return sniff_filetype(file.read(SNIFF_SIZE))
+    except OSError as e:
+        logging.warning(f"Could not read {path}: {e}")
+        return None
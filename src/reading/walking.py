@@ -0,0 +1,104 @@
+import fnmatch
+import logging
+import os
+import re
+from typing import Iterator, Sequence, Set, Tuple
+
+
+# Include and exclude glob patterns, matched case-insensitively against paths relative to the walked root.
+# A `*` also matches `/`, so `*.pdf` selects pdf files at any depth. Excluded directories are pruned.
+class PathFilter(object):
+
+    def __init__(self, include: Sequence[str] = (), exclude: Sequence[str] = ()):
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+
+    def __bool__(self):
+        return self.include is not None or self.exclude is not None
+
+    def match(self, relative_path: str) -> bool:
+        if self.exclude is not None and self.exclude.match(relative_path):
+            return False
+        return self.include is None or self.include.match(relative_path) is not None
+
+    def prune(self, relative_dir: str) -> bool:
+        return self.exclude is not None and self.exclude.match(relative_dir) is not None
+
+
+def compile_patterns(patterns: Sequence[str]) -> re.Pattern | None:
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns), re.IGNORECASE)
+
+
+# Yields the files below `root` lazily, depth first and in directory order like Path.rglob.
+# Only the cached type information of directory entries is used for plain files, directories are
+# stat'ed once each to recognize symlink loops and directories reachable through several links.
+# Files reachable through hardlinks or symlinks are yielded only once.
+def walk_files(
+        root,
+        path_filter: PathFilter | None = None,
+        skip_hidden: bool = True,
+        follow_symlinks: bool = True
+) -> Iterator[os.DirEntry]:
+    try:
+        root_stat = os.stat(root)
+    except OSError as e:
+        logging.warning(f"Could not walk {root}: {e}")
+        return
+
+    visited_dirs: Set[Tuple[int, int]] = {(root_stat.st_dev, root_stat.st_ino)}
+    seen_files: Set[Tuple[int, int]] = set()
+    # Directories still to walk with their device and path relative to root, the next one is on top
+    pending = [(os.fspath(root), root_stat.st_dev, '')]
+    while pending:
+        directory, device, relative_dir = pending.pop()
+        try:
+            with os.scandir(directory) as scanner:
+                entries = list(scanner)
+        except OSError as e:
+            logging.warning(f"Could not list directory {directory}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if skip_hidden and entry.name.startswith('.'):
+                continue
+
+            relative_path = relative_dir + entry.name
+            try:
+                is_symlink = entry.is_symlink()
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if path_filter and path_filter.prune(relative_path):
+                        continue
+                    stat = entry.stat(follow_symlinks=True)
+                    key = (stat.st_dev, stat.st_ino)
+                    if key in visited_dirs:
+                        logging.debug(f"Skipping already visited directory {entry.path}")
+                        continue
+                    visited_dirs.add(key)
+                    subdirs.append((entry.path, stat.st_dev, relative_path + '/'))
+                    continue
+
+                if not entry.is_file(follow_symlinks=follow_symlinks):
+                    continue
+                if path_filter and not path_filter.match(relative_path):
+                    continue
+
+                # A plain file lives on the device of its directory, only symlinks need a stat
+                if is_symlink:
+                    stat = entry.stat(follow_symlinks=True)
+                    key = (stat.st_dev, stat.st_ino)
+                else:
+                    key = (device, entry.inode())
+            except OSError as e:
+                logging.warning(f"Could not inspect {entry.path}: {e}")
+                continue
+
+            if key in seen_files:
+                logging.debug(f"Skipping duplicate link {entry.path}")
+                continue
+            seen_files.add(key)
+            yield entry
+
+        pending.extend(reversed(subdirs))
@@ -1,10 +1,31 @@
 import csv
+import gzip
+import html
+import json
+import os
 import re
+import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Iterable, Tuple, TextIO, NamedTuple, AsyncIterable
 
 from src.constants import TABLE_HEADERS, HTML_TABLE_STYLES
-from src.reading.reading import Metadata
+from src.reading.metadata import Metadata, MetadataTable
+
+SUBMITTER_REGEX = re.compile(r"\d{4}_\d{4}_([A-Z][a-z]+_[A-Z][a-z]+)_")
+
+# Writers hand text to their file in chunks of roughly this many characters
+WRITE_CHUNK_SIZE = 256 * 1024
+
+Submissions = Dict[Path, MetadataTable] | Iterable[Tuple[Path, MetadataTable]]
+
+
+class ReportRow(NamedTuple):
+    directory: Path
+    submitter: str
+    metadata: Metadata | None  # None for the placeholder row of a submission without files
+    values: List[str]
+    failure: str | None = None  # Why the submission could not be extracted, see MetadataTable.failure
+
 
 def get_row_data(metadata, submitter) -> List[str]:
     return [
@@ -21,38 +42,231 @@ def get_row_data(metadata, submitter) -> List[str]:
         metadata.pages or ''
     ]
 
-def write_metadata_to_html(dir_to_metadatas: Dict[Path, List[Metadata]], output_html: Path):
-    with open(output_html, 'w', encoding='utf-8') as html_file:
-        html_file.write(
+
+def get_submission_rows(directory: Path, metadatas: MetadataTable | List[Metadata]) -> List[ReportRow]:
+    submitter = str(extract_submitter(directory, SUBMITTER_REGEX))
+    if len(metadatas) == 0:
+        failure = metadatas.failure if isinstance(metadatas, MetadataTable) else None
+        return [ReportRow(directory, submitter, None, ['', '', submitter, '', '', '', '', '', '', '', ''], failure)]
+
+    return [
+        ReportRow(directory, submitter, metadata, [str(data) for data in get_row_data(metadata, submitter)])
+        for metadata in metadatas
+    ]
+
+
+def iter_submissions(dir_to_metadatas: Submissions) -> Iterable[Tuple[Path, MetadataTable]]:
+    if isinstance(dir_to_metadatas, dict):
+        return dir_to_metadatas.items()
+    return dir_to_metadatas
+
+
+def open_output(path: Path, newline: str | None = None) -> TextIO:
+    if path.suffix == '.gz':
+        return gzip.open(path, 'wt', encoding='utf-8', newline=newline)
+    return open(path, 'w', encoding='utf-8', newline=newline)
+
+
+# Base of all report writers: rows arrive one submission at a time, the formatted text is buffered
+# and reaches the output in large chunks. `output` is either a path to create or an open text stream.
+# Paths are written under a hidden partial name and only replace the output once complete.
+class ReportWriter(object):
+    newline: str | None = None
+
+    def __init__(self, output: Path | TextIO, chunk_size: int = WRITE_CHUNK_SIZE):
+        self.output = output
+        self.chunk_size = chunk_size
+        self.file: TextIO | None = None
+        self.parts: List[str] = []
+        self.buffered = 0
+
+    @property
+    def partial_output(self) -> Path:
+        return self.output.with_name(f".{self.output.stem}.part{self.output.suffix}")
+
+    def __enter__(self):
+        if isinstance(self.output, Path):
+            self.file = open_output(self.partial_output, self.newline)
+        else:
+            self.file = self.output
+        self.write_header()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not isinstance(self.output, Path):
+            self.write_footer()
+            self.flush()
+            self.file.flush()
+            return
+
+        try:
+            if exc_type is None:
+                self.write_footer()
+                self.flush()
+        finally:
+            self.file.close()
+        # A failed run leaves the previous report in place
+        if exc_type is None:
+            os.replace(self.partial_output, self.output)
+            print(f'Metadata written to {self.output}', file=sys.stderr)
+        else:
+            self.partial_output.unlink(missing_ok=True)
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.file.write(''.join(self.parts))
+            self.parts.clear()
+            self.buffered = 0
+
+    def write_header(self):
+        pass
+
+    def write_rows(self, rows: List[ReportRow]):
+        pass
+
+    def write_footer(self):
+        pass
+
+
+# Submitter and filename of the files of each content hash, for the duplicate section of HtmlReportWriter.
+# Hashes are kept as bytes and a content seen once as a single pair, which is all most of them ever get.
+class DuplicateTracker(object):
+
+    def __init__(self):
+        self.files: Dict[bytes, Tuple[str, str] | List[Tuple[str, str]]] = {}
+
+    def add(self, content_hash: str, submitter: str, filename: str):
+        key = bytes.fromhex(content_hash)
+        files = self.files.get(key)
+        if files is None:
+            self.files[key] = (submitter, filename)
+        elif isinstance(files, tuple):
+            self.files[key] = [files, (submitter, filename)]
+        else:
+            files.append((submitter, filename))
+
+    # Contents submitted by more than one submitter, with their files, largest groups first
+    def duplicate_groups(self) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        groups = []
+        for key, files in self.files.items():
+            if isinstance(files, list) and len({submitter for submitter, _ in files}) > 1:
+                groups.append((key.hex(), files))
+        groups.sort(key=lambda group: (-len({submitter for submitter, _ in group[1]}), -len(group[1])))
+        return groups
+
+
+# Besides the table of files, groups of identical files across submitters are listed after it with
+# `duplicates`. Their hashes and filenames are kept until the end of the report.
+class HtmlReportWriter(ReportWriter):
+
+    def __init__(self, output: Path | TextIO, chunk_size: int = WRITE_CHUNK_SIZE, duplicates=False):
+        super().__init__(output, chunk_size)
+        self.duplicates = DuplicateTracker() if duplicates else None
+
+    def write_header(self):
+        self.write(
             f"<html lang=sk><head>"
             f"""<meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>"""
             f"{HTML_TABLE_STYLES}"
             f"<title>Metadata Report</title> </head> <body>"
         )
 
-        html_file.write('<h1>Metadata Report</h1>\n')
+        self.write('<h1>Metadata Report</h1>\n')
 
         table_headers = ''.join(f'<th>{header}</th>' for header in TABLE_HEADERS)
-        html_file.write('<table><tr>' + table_headers + '</tr>\n')
+        self.write('<table><tr>' + table_headers + '</tr>\n')
+
+    def write_rows(self, rows: List[ReportRow]):
+        for row in rows:
+            self.write('<tr><td>' + '</td><td>'.join(row.values) + '</td></tr>\n')
+            if self.duplicates is not None and row.metadata is not None and row.metadata.content_hash:
+                self.duplicates.add(row.metadata.content_hash, row.submitter, row.metadata.filename)
+
+    def write_footer(self):
+        self.write('</table>\n')
+        self.write_duplicates()
+        self.write('</body></html>\n')
+
+    def write_duplicates(self):
+        groups = self.duplicates.duplicate_groups() if self.duplicates is not None else []
+        if not groups:
+            return
+
+        self.write('<h2>Duplicate files</h2>\n')
+        self.write('<table><tr><th>Content hash</th><th>Submitters</th><th>Files</th></tr>\n')
+        for content_hash, files in groups:
+            submitters = len({submitter for submitter, _ in files})
+            # Names come from the submissions, they are escaped like any untrusted text
+            listed = '<br>'.join(f'{html.escape(submitter)}: {html.escape(filename)}' for submitter, filename in files)
+            self.write(f'<tr><td>{content_hash}</td><td>{submitters}</td><td>{listed}</td></tr>\n')
+        self.write('</table>\n')
+
+
+class CsvReportWriter(ReportWriter):
+    newline = ''
 
-        submitter_regex = re.compile(r"\d{4}_\d{4}_([A-Z][a-z]+_[A-Z][a-z]+)_")
+    def write_header(self):
+        # The csv module formats rows into this writer's own buffer
+        self.csv_writer = csv.writer(self)
+        self.csv_writer.writerow(TABLE_HEADERS)
 
-        for directory, metadatas in dir_to_metadatas.items():  # type: Path, List[Metadata]
-            submitter = extract_submitter(directory, submitter_regex)
-            if len(metadatas) == 0:
-                row_data = ['', '', submitter, '', '', '', '', '', '', '', '']
-                html_file.write(
-                    '<tr>' + ''.join(f'<td>{data}</td>' for data in row_data) + '</tr>\n')
+    def write_rows(self, rows: List[ReportRow]):
+        self.csv_writer.writerows(row.values for row in rows)
 
-            for metadata in metadatas:
-                row_data = get_row_data(metadata, submitter)
-                html_file.write(
-                    '<tr>' + ''.join(f'<td>{data}</td>' for data in row_data) + '</tr>\n')
 
-        html_file.write('</table>\n')
-        html_file.write('</body></html>\n')
+# One JSON object per line and file, a submission without files gets a single line with null metadata.
+# With `flush_submissions` every submission is flushed, so readers at the end of a pipe see it right away.
+class JsonLinesReportWriter(ReportWriter):
+
+    def __init__(self, output: Path | TextIO, chunk_size: int = WRITE_CHUNK_SIZE, flush_submissions=False):
+        super().__init__(output, chunk_size)
+        self.flush_submissions = flush_submissions
+
+    def write_rows(self, rows: List[ReportRow]):
+        for row in rows:
+            self.write(json.dumps({
+                'submission': str(row.directory),
+                'submitter': row.submitter,
+                'metadata': row.metadata.to_dict() if row.metadata else None
+            }, ensure_ascii=False) + '\n')
+
+        if self.flush_submissions:
+            self.flush()
+            self.file.flush()
+
+
+# Rows are computed once per submission and fanned out to every writer in a single pass
+def write_report(dir_to_metadatas: Submissions, writers: List[ReportWriter]):
+    write_report_rows(
+        (get_submission_rows(directory, metadatas) for directory, metadatas in iter_submissions(dir_to_metadatas)),
+        writers
+    )
+
+
+# Rows built earlier, one list per submission
+def write_report_rows(submission_rows: Iterable[List[ReportRow]], writers: List[ReportWriter]):
+    for rows in submission_rows:
+        for writer in writers:
+            writer.write_rows(rows)
+
+
+async def write_report_async(dir_to_metadatas: AsyncIterable[Tuple[Path, MetadataTable]], writers: List[ReportWriter]):
+    async for directory, metadatas in dir_to_metadatas:
+        rows = get_submission_rows(directory, metadatas)
+        for writer in writers:
+            writer.write_rows(rows)
+
+
+def write_metadata_to_html(dir_to_metadatas: Submissions, output_html: Path):
+    with HtmlReportWriter(Path(output_html)) as writer:
+        write_report(dir_to_metadatas, [writer])
 
-    print(f'Metadata written to {output_html}')
 
 def extract_submitter(dir, submitter_regex):
     submitter_match = submitter_regex.search(str(dir))
@@ -62,20 +276,7 @@ def extract_submitter(dir, submitter_regex):
         submitter = dir
     return submitter
 
-def write_metadata_to_csv(dir_to_metadatas: Dict[Path, List[Metadata]], output_csv: Path):
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(TABLE_HEADERS)
-        submitter_regex = re.compile(r"\d{4}_\d{4}_([A-Z][a-z]+_[A-Z][a-z]+)_")
-        for directory, metadatas in dir_to_metadatas.items():
-            submitter = extract_submitter(str(directory), submitter_regex)
-            if len(metadatas) == 0:
-                row_data = ['', '', submitter, '', '', '', '', '', '', '', '']
-                writer.writerow(row_data)
-
-            for metadata in metadatas:
-                row_data = get_row_data(metadata, submitter)
-                writer.writerow(row_data)
-
-    print(f'Metadata written to {output_csv}')
 
+def write_metadata_to_csv(dir_to_metadatas: Submissions, output_csv: Path):
+    with CsvReportWriter(Path(output_csv)) as writer:
+        write_report(dir_to_metadatas, [writer])
@@ -0,0 +1,371 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.reading.cache import MetadataCache, DEFAULT_CACHE_DIR
+from src.reading.extraction import ExtractionLimits, MiB, close_source, spool
+from src.reading.reading import read_metadata, detect_filetype, READER_VERSION
+from src.reading.simple_exiftool import ExifToolPool
+
+logging.getLogger().setLevel(logging.INFO)
+
+UPLOAD_CHUNK_SIZE = 1 * MiB
+
+
+# Request counters and timings served by /metrics in the Prometheus text format
+class ServerMetrics(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests: Dict[int, int] = {}
+        self.rejected = 0
+        self.in_flight = 0
+        self.seconds = 0.0
+        self.bytes_read = 0
+
+    def record(self, status: int, seconds: float, bytes_read: int = 0):
+        with self._lock:
+            self.requests[status] = self.requests.get(status, 0) + 1
+            self.seconds += seconds
+            self.bytes_read += bytes_read
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def render(self, exif_tool: ExifToolPool) -> str:
+        with self._lock:
+            lines = [
+                "# TYPE metadata_requests_total counter",
+                *(f'metadata_requests_total{{status="{status}"}} {count}'
+                  for status, count in sorted(self.requests.items())),
+                "# TYPE metadata_requests_rejected_total counter",
+                f"metadata_requests_rejected_total {self.rejected}",
+                "# TYPE metadata_requests_in_flight gauge",
+                f"metadata_requests_in_flight {self.in_flight}",
+                "# TYPE metadata_request_seconds_total counter",
+                f"metadata_request_seconds_total {self.seconds:.6f}",
+                "# TYPE metadata_upload_bytes_total counter",
+                f"metadata_upload_bytes_total {self.bytes_read}",
+                "# TYPE metadata_exiftool_processes gauge",
+                f"metadata_exiftool_processes {exif_tool.processes}",
+                "# TYPE metadata_uptime_seconds gauge",
+                f"metadata_uptime_seconds {time.time() - self.started:.3f}",
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+# Long-lived extraction service: the readers stay imported and the exiftool pool warm between requests.
+# At most `concurrency` files are read at once, requests waiting longer than `queue_timeout` seconds
+# for their turn are turned away. Paths are only read below one of `allowed_roots`.
+# Files are read by a pool of reader threads, a request gets its answer within `file_timeout` seconds.
+# A native parser cannot be interrupted in a thread though, one over its budget keeps the slot of its
+# request until it is done, so stalled files take turns away from other requests rather than piling up.
+class MetadataServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address,
+            exif_tool: ExifToolPool,
+            cache: MetadataCache | None = None,
+            concurrency: int = 8,
+            queue_timeout: float = 5.0,
+            max_upload_size: int = ExtractionLimits().max_member_size,
+            spool_size: int = ExtractionLimits().spool_size,
+            allowed_roots: List[Path] = (),
+            file_timeout: float | None = None
+    ):
+        super().__init__(address, MetadataRequestHandler)
+        self.exif_tool = exif_tool
+        self.cache = cache
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_upload_size = max_upload_size
+        self.spool_size = spool_size
+        # Uploaded documents that are archives themselves are read within the same limits
+        self.limits = ExtractionLimits(max_member_size=max_upload_size, spool_size=spool_size)
+        self.allowed_roots = [root.resolve() for root in allowed_roots]
+        self.file_timeout = file_timeout
+        self.readers = concurrent.futures.ThreadPoolExecutor(concurrency, thread_name_prefix='reader')
+        self.metrics = ServerMetrics()
+
+    def server_close(self):
+        super().server_close()
+        self.readers.shutdown(wait=False, cancel_futures=True)
+
+    def is_allowed(self, path: Path) -> bool:
+        return any(path.is_relative_to(root) for root in self.allowed_roots)
+
+
+class MetadataRequestHandler(BaseHTTPRequestHandler):
+    server: MetadataServer
+    protocol_version = "HTTP/1.1"
+    # Read of the current request still running past its time budget, it releases the slot once done
+    overdue_read: concurrent.futures.Future | None = None
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def send_json(self, status: int, body: Dict):
+        self.send_text(status, json.dumps(body, ensure_ascii=False), 'application/json')
+
+    def send_text(self, status: int, text: str, content_type: str = 'text/plain; version=0.0.4'):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+        self.send_header('Content-Length', str(len(data)))
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self.send_text(HTTPStatus.OK, self.server.metrics.render(self.server.exif_tool))
+        elif url.path == '/health':
+            self.send_json(HTTPStatus.OK, {'status': 'ok'})
+        elif url.path == '/metadata':
+            self.handle_metadata(url.query, upload=False)
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == '/metadata':
+            self.handle_metadata(url.query, upload=True)
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown endpoint {url.path}"})
+
+    # GET /metadata?path=... reads a file on the server, POST /metadata?name=... the uploaded body
+    def handle_metadata(self, query: str, upload: bool):
+        server = self.server
+        started = time.monotonic()
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+
+        refusal = self.check_upload() if upload else None
+        if refusal is None and not server.slots.acquire(timeout=server.queue_timeout):
+            server.metrics.reject()
+            refusal = HTTPStatus.SERVICE_UNAVAILABLE, "Too many requests in flight"
+        if refusal is not None:
+            # The body is left unread, so the connection cannot take another request
+            self.close_connection = True
+            status, error = refusal
+            self.send_json(status, {'error': error})
+            server.metrics.record(status, time.monotonic() - started)
+            return
+
+        server.metrics.enter()
+        self.overdue_read = None
+        bytes_read = 0
+        try:
+            if upload:
+                status, body, bytes_read = self.read_upload(params.get('name') or 'upload')
+            else:
+                status, body = self.read_path(params.get('path'))
+        except Exception as e:
+            logging.exception(f"Failed to handle {self.path}")
+            self.close_connection = True
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+        finally:
+            if self.overdue_read is None:
+                server.slots.release()
+            else:
+                self.overdue_read.add_done_callback(lambda _: server.slots.release())
+            server.metrics.leave()
+
+        self.send_json(status, body)
+        server.metrics.record(status, time.monotonic() - started, bytes_read)
+
+    # Status and error of an upload refused before its body is read, None if it is accepted
+    def check_upload(self) -> Tuple[int, str] | None:
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            return HTTPStatus.LENGTH_REQUIRED, "Uploads need a Content-Length"
+        if int(length) > self.server.max_upload_size:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Uploads are limited to {self.server.max_upload_size} bytes"
+        return None
+
+    def iter_body(self, length: int) -> Iterator[bytes]:
+        while length > 0:
+            chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                raise ConnectionError("Upload ended early")
+            length -= len(chunk)
+            yield chunk
+
+    def read_upload(self, name: str):
+        length = int(self.headers['Content-Length'])
+        # Only the name is taken from the client, the upload is never written under it
+        file_path = Path(os.path.basename(name))
+        source = spool(self.iter_body(length), self.server.spool_size)
+        try:
+            status, body = self.read_file(file_path, source)
+        finally:
+            close_source(source)
+        return status, body, length
+
+    def read_path(self, path: str | None):
+        if not path:
+            return HTTPStatus.BAD_REQUEST, {'error': "Missing path parameter"}
+        file_path = Path(path).resolve()
+        if not self.server.is_allowed(file_path):
+            return HTTPStatus.FORBIDDEN, {'error': f"Path is outside the allowed roots: {path}"}
+        if not file_path.is_file():
+            return HTTPStatus.NOT_FOUND, {'error': f"No such file: {path}"}
+        return self.read_file(file_path)
+
+    def read_file(self, file_path: Path, source: bytes | None = None):
+        filetype = detect_filetype(file_path, source)
+        if filetype is None:
+            return HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {'error': f"Unsupported file format: {file_path.name}"}
+        server = self.server
+        read = server.readers.submit(
+            read_metadata, file_path, server.exif_tool, source, server.cache, filetype, limits=server.limits
+        )
+        try:
+            metadata = read.result(timeout=server.file_timeout)
+        except concurrent.futures.TimeoutError:
+            logging.error(f"Reading {file_path} took longer than {server.file_timeout:g} seconds")
+            self.overdue_read = read
+            return HTTPStatus.GATEWAY_TIMEOUT, {
+                'error': f"Reading {file_path.name} took longer than {server.file_timeout:g} seconds"
+            }
+        if metadata is None:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {'error': f"Could not read {file_path.name} as {filetype}"}
+        return HTTPStatus.OK, {'filetype': filetype, 'metadata': metadata.to_dict()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on."
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port to listen on."
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of files read at once, further requests wait for their turn."
+    )
+
+    parser.add_argument(
+        "--queue-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds a request waits for its turn before it is answered with 503."
+    )
+
+    parser.add_argument(
+        "--allow-path",
+        type=Path,
+        action="append",
+        default=[],
+        help="Directory whose files may be read by path (repeatable), by default only uploads are read."
+    )
+
+    parser.add_argument(
+        "--max-upload-size",
+        type=int,
+        default=ExtractionLimits().max_member_size // MiB,
+        help="Largest accepted upload, in MiB."
+    )
+
+    parser.add_argument(
+        "--exiftool-workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of exiftool processes kept running."
+    )
+
+    parser.add_argument(
+        "--file-timeout",
+        type=float,
+        default=60,
+        help="Seconds a file may take before it is answered with 504 (0 waits indefinitely). Exiftool is "
+             "restarted after that long, a native parser keeps its slot until it finishes in the background."
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory of the extraction cache shared with the command line tool."
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Specify this flag to neither read nor update the extraction cache."
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    cache = None
+    if not args.no_cache:
+        cache = MetadataCache(args.cache_dir, READER_VERSION)
+
+    with ExifToolPool(args.exiftool_workers, timeout=args.file_timeout or None) as exif_tool:
+        # The first exiftool process is started up front, so the first request does not wait for it
+        try:
+            exif_tool.execute("-ver")
+        except OSError as e:
+            logging.warning(f"Could not start exiftool, perhaps it is not installed ({e}). "
+                            f"Files are read by the native readers only.")
+        server = MetadataServer(
+            (args.host, args.port),
+            exif_tool,
+            cache,
+            concurrency=max(1, args.concurrency),
+            queue_timeout=args.queue_timeout,
+            max_upload_size=args.max_upload_size * MiB,
+            allowed_roots=args.allow_path,
+            file_timeout=args.file_timeout or None
+        )
+        logging.info(f"Serving metadata on http://{args.host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Shutting down")
+        finally:
+            server.server_close()
+
+    if cache is not None:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from src.reading.metadata import MetadataTable
+from src.reading.walking import PathFilter, walk_files
+from src.report_writing import ReportRow, get_submission_rows
+
+Fingerprint = Tuple
+
+# Seconds between two polls that fingerprint every submission in depth, see SubmissionWatcher
+DEFAULT_RESCAN_INTERVAL = 300.0
+
+
+# Changes whenever a file of the submission is added, removed, resized or rewritten. Zipped submissions
+# are single files, directories are walked like the readers walk them.
+def fingerprint_submission(path: Path, path_filter: PathFilter | None = None) -> Fingerprint:
+    stat = path.stat()
+    if not path.is_dir():
+        return stat.st_size, stat.st_mtime_ns
+
+    files = []
+    for entry in walk_files(path, path_filter):
+        try:
+            file_stat = entry.stat()
+        except OSError:
+            continue
+        files.append((entry.path, file_stat.st_size, file_stat.st_mtime_ns))
+    return tuple(sorted(files))
+
+
+# Size and mtime of a submission entry of the input directory. The mtime of a directory changes when files
+# are added to or removed from it directly, not when nested files change.
+def entry_stamp(entry: os.DirEntry) -> Fingerprint:
+    stat = entry.stat()
+    return entry.is_dir(), stat.st_size, stat.st_mtime_ns
+
+
+# Polls the submissions of the input directory for changes, without any OS specific notification API.
+# A new or changed submission is only due once it looks the same on two polls in a row, so uploads
+# still being copied are not read halfway. All submissions are due on the first poll.
+# A poll only stats the entries of the input directory, submissions are walked in depth when they are new,
+# their entry changed or they are not settled yet. Changes deeper inside a submission that leave its entry
+# alone are found by a full rescan every `rescan_interval` seconds.
+class SubmissionWatcher(object):
+
+    def __init__(
+            self,
+            input_dir: Path,
+            path_filter: PathFilter | None = None,
+            rescan_interval: float = DEFAULT_RESCAN_INTERVAL
+    ):
+        self.input_dir = input_dir
+        self.path_filter = path_filter
+        self.rescan_interval = rescan_interval
+        self.submissions: List[Path] = []
+        self._stamps: Dict[Path, Fingerprint] = {}
+        self._seen: Dict[Path, Fingerprint] = {}
+        self._extracted: Dict[Path, Fingerprint] = {}
+        self._first = True
+        self._rescanned = time.monotonic()
+
+    def poll(self) -> Tuple[List[Path], List[Path]]:
+        rescan = self._first or time.monotonic() - self._rescanned >= self.rescan_interval
+        if rescan:
+            self._rescanned = time.monotonic()
+
+        stamps: Dict[Path, Fingerprint] = {}
+        seen: Dict[Path, Fingerprint] = {}
+        for entry in os.scandir(self.input_dir):
+            subdir = Path(entry.path)
+            try:
+                stamps[subdir] = entry_stamp(entry)
+                previous = self._seen.get(subdir)
+                if (
+                        rescan or previous is None or stamps[subdir] != self._stamps.get(subdir)
+                        or previous != self._extracted.get(subdir)
+                ):
+                    seen[subdir] = fingerprint_submission(subdir, self.path_filter)
+                else:
+                    seen[subdir] = previous
+            except OSError as e:
+                # Removed while it was being looked at, the next poll sees it gone
+                logging.debug(f"Could not fingerprint {subdir}: {e}")
+                stamps.pop(subdir, None)
+
+        changed = [
+            subdir for subdir, fingerprint in seen.items()
+            if fingerprint != self._extracted.get(subdir) and (self._first or fingerprint == self._seen.get(subdir))
+        ]
+        removed = [subdir for subdir in self._extracted if subdir not in seen]
+
+        for subdir in changed:
+            self._extracted[subdir] = seen[subdir]
+        for subdir in removed:
+            del self._extracted[subdir]
+        self.submissions = list(seen)
+        self._stamps = stamps
+        self._seen = seen
+        self._first = False
+        return changed, removed
+
+
+# Keeps the report up to date until interrupted: only due submissions are extracted again and only their
+# report rows built anew, after which the report files are rewritten from the rows kept in memory. `write`
+# receives the rows of all submissions in input order and `extracted` only the submissions just extracted.
+def watch(
+        watcher: SubmissionWatcher,
+        extract: Callable[[List[Path]], Iterable[Tuple[Path, MetadataTable]]],
+        write: Callable[[List[List[ReportRow]]], None],
+        interval: float = 2.0,
+        extracted: Callable[[List[Tuple[Path, MetadataTable]]], None] | None = None
+):
+    dir_to_rows: Dict[Path, List[ReportRow]] = {}
+    while True:
+        changed, removed = watcher.poll()
+        if changed or removed:
+            started = time.monotonic()
+            for subdir in removed:
+                dir_to_rows.pop(subdir, None)
+
+            submissions = list(extract(changed))
+            for subdir, metadatas in submissions:
+                dir_to_rows[subdir] = get_submission_rows(subdir, metadatas)
+            if extracted is not None:
+                extracted(submissions)
+
+            write([dir_to_rows[subdir] for subdir in watcher.submissions if subdir in dir_to_rows])
+            logging.info(
+                f"Report updated for {len(changed)} changed and {len(removed)} removed submissions "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+        time.sleep(interval)